@@ -1,13 +1,14 @@
 import pandas as pd
 import os
 
-from utils import init_grammar
+from Grammar import as_grammar
+from utils import load_grammar
 
 
 class AnMapConstruct:
     def __init__(self, grammar):
-        self.grammar = grammar
-        self.non_ts = grammar[~grammar.index.duplicated(keep='first')].index
+        self.grammar = as_grammar(grammar)
+        self.non_ts = self.grammar.non_ts
 
         # first_dict is a python dict used to store FIRST(a) array corresponding to one non-terminal symbol and formula.
         # The dict's form is (non-terminal, formula) -> FIRST(a) list.
@@ -17,21 +18,20 @@ class AnMapConstruct:
         # The dict's form is non-terminal -> FOLLOW(a) set.
         self.follow_dict = dict()
 
+        # an_map is the LL(1) analysis sheet built by construct_map.
+        # The dict's form is non-terminal -> {terminal: formula}, empty items are left out.
+        self.an_map = dict()
+        self.all_terminal = []
+        self.start_symbol = None
+
     def get_all_formulas(self, non_t):
         """
         Returns all formulas corresponding to the specified non-terminal symbol.
 
         :param non_t: string, the non-terminal symbol.
-        :return: list or pandas Series, all formulas corresponding to the specified non-terminal symbol
+        :return: list, all formulas corresponding to the specified non-terminal symbol
         """
-        formulas = self.grammar.loc[non_t]
-        formulas = formulas["formula"]
-        if type(formulas).__name__ == "str":
-            # If there is only one formula corresponding to the non-terminal symbol,
-            # the returned 'formulas' could be string object.
-            # Considering we have to traverse 'formulas', we turn it to a list here.
-            formulas = [formulas]
-        return formulas
+        return self.grammar.get_all_formulas(non_t)
 
     def construct_first(self):
         """
@@ -223,6 +223,9 @@ class AnMapConstruct:
                     for single_first in self.first_dict[(non_t, formula)]:
                         row[all_terminal.index(single_first)] = formula
             an_matrix.append([non_t] + row)
+            self.an_map[non_t] = {t: formula for t, formula in zip(all_terminal, row) if formula is not None}
+        self.all_terminal = all_terminal
+        self.start_symbol = start_symbol
 
         # Write analysis sheet into csv file, using pandas.
         an_df = pd.DataFrame(an_matrix[1:], columns=an_matrix[0])
@@ -248,7 +251,7 @@ class AnMapConstruct:
 
 
 if __name__ == "__main__":
-    map_construct = AnMapConstruct(init_grammar(os.path.join("OperatorPriority", "data", "grammar.txt"), "txt_file"))
+    map_construct = AnMapConstruct(load_grammar(os.path.join("OperatorPriority", "data", "grammar.txt")))
     map_construct.print_grammar()
     map_construct.construct_first()
     map_construct.construct_follow('E')
@@ -0,0 +1,235 @@
+"""
+Time and memory of every table construction phase on synthetic grammars.
+
+Usage:
+    python -m Benchmark.ConstructBench --output construct.json
+    python -m Benchmark.ConstructBench --output new.json --compare construct.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from AnMapConstruct import AnMapConstruct
+from Benchmark.SyntheticGrammar import FAMILIES
+from Instrumentation import BuildStats
+from OperatorPriority.FormMatrix import FormMatrix as OperatorFormMatrix
+from OperatorPriority.LevelMatrix import LevelMatrix
+from SimplePriority.FormMatrix import FormMatrix as SimpleFormMatrix
+
+
+def build_phases(form_matrix_class):
+    """
+    :param form_matrix_class: class, SimplePriority or OperatorPriority FormMatrix, or any callable
+        taking (grammar, stats) like LevelMatrix.from_grammar.
+    :return: function, running the whole build with phases recorded by Instrumentation.BuildStats.
+    """
+
+    def run(grammar, trace_memory):
+        stats = BuildStats()
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            tables = form_matrix_class(grammar, stats)
+            # FormMatrix builds its derived tables on first access.
+            if hasattr(tables, "build"):
+                tables.build()
+        except (KeyError, ValueError, IndexError) as e:
+            failed = stats.current
+            result = {phase.name: (phase.seconds, phase.peak_bytes) for phase in stats.phases}
+            result[failed.name if failed is not None else "build"] = "{}: {}".format(type(e).__name__, e)
+            return result
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        return {phase.name: (phase.seconds, phase.peak_bytes) for phase in stats.phases}
+
+    return run
+
+
+def ll1_phases(grammar, trace_memory):
+    """
+    Run AnMapConstruct phases, FIRST, FOLLOW and the LL(1) sheet, with their console output discarded.
+
+    :param grammar: Grammar.
+    :param trace_memory: bool, whether to record peak memory of every phase with tracemalloc.
+    :return: dict, phase name -> (seconds, peak bytes or None). A failing phase stops the run
+        and is recorded with its error message instead.
+    """
+    map_construct = AnMapConstruct(grammar)
+    start_symbol = grammar.non_ts[0]
+    phases = [("first", map_construct.construct_first),
+              ("follow", lambda: map_construct.construct_follow(start_symbol)),
+              ("ll1_map", lambda: map_construct.construct_map(start_symbol))]
+    result = dict()
+    for name, function in phases:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+        except (KeyError, ValueError, IndexError, RecursionError) as e:
+            result[name] = "{}: {}".format(type(e).__name__, e)
+            break
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        result[name] = (seconds, peak)
+    return result
+
+
+# Engine name -> function running all phases on a grammar.
+ENGINES = {
+    "simple": build_phases(SimpleFormMatrix),
+    "operator": build_phases(OperatorFormMatrix),
+    "levels": build_phases(LevelMatrix.from_grammar),
+    "ll1": ll1_phases,
+}
+
+
+def benchmark(engines, families, repeat=3):
+    """
+    Benchmark every engine on every synthetic grammar size.
+
+    Time is the best of repeat runs without tracing, peak memory is taken from one extra
+    run under tracemalloc, so tracing overhead does not affect time.
+
+    :param engines: list, engine names in ENGINES.
+    :param families: dict, family name -> list of sizes.
+    :param repeat: int, number of timed runs.
+    :return: list, one record dict per (engine, family, size, phase).
+    """
+    records = []
+    for engine in engines:
+        for family, sizes in families.items():
+            generator = FAMILIES[family][0]
+            for size in sizes:
+                grammar = generator(*size)
+                best = dict()
+                errors = dict()
+                for run in range(repeat + 1):
+                    gc.collect()
+                    trace_memory = run == repeat
+                    for name, value in ENGINES[engine](grammar, trace_memory).items():
+                        if isinstance(value, str):
+                            errors[name] = value
+                            continue
+                        seconds, peak = value
+                        if trace_memory:
+                            best[name] = (best.get(name, (seconds, None))[0], peak)
+                        elif name not in best or seconds < best[name][0]:
+                            best[name] = (seconds, None)
+                    if len(errors) > 0:
+                        break
+                for name, (seconds, peak) in best.items():
+                    records.append({"engine": engine, "family": family, "size": list(size),
+                                    "productions": len(grammar), "phase": name,
+                                    "seconds": seconds, "peak_bytes": peak})
+                for name, error in errors.items():
+                    records.append({"engine": engine, "family": family, "size": list(size),
+                                    "productions": len(grammar), "phase": name, "error": error})
+    return records
+
+
+def environment():
+    """
+    :return: dict, information about the running environment.
+    """
+    return {"python": sys.version, "numpy": np.__version__,
+            "platform": platform.platform(), "processor": platform.processor()}
+
+
+def record_key(record):
+    return record["engine"], record["family"], tuple(record["size"]), record["phase"]
+
+
+def compare(records, baseline, threshold=1.25, min_seconds=0.001):
+    """
+    Flag phases which are slower or use more memory than the baseline.
+
+    :param records: list, records of the current run.
+    :param baseline: list, records of the baseline run.
+    :param threshold: float, allowed ratio between current and baseline values.
+    :param min_seconds: float, phases faster than this in both runs are too noisy to compare in time.
+    :return: list, one message per regression.
+    """
+    base = {record_key(record): record for record in baseline}
+    regressions = []
+    for record in records:
+        old = base.get(record_key(record))
+        if old is None:
+            continue
+        name = "{} {} {} {}".format(*record_key(record))
+        if "error" in record:
+            if "error" not in old:
+                regressions.append("{}: now fails with {}".format(name, record["error"]))
+            continue
+        if "error" in old:
+            continue
+        for field in ("seconds", "peak_bytes"):
+            if field == "seconds" and max(old[field], record[field]) < min_seconds:
+                continue
+            if old[field] and record[field] and record[field] > old[field] * threshold:
+                regressions.append("{}: {} {:.4g} -> {:.4g} ({:.2f}x)".format(
+                    name, field, old[field], record[field], record[field] / old[field]))
+    return regressions
+
+
+def print_records(records):
+    print("{:9}{:11}{:10}{:17}{:>12}{:>14}".format("engine", "family", "size", "phase", "seconds", "peak bytes"))
+    for record in records:
+        size = "x".join(str(n) for n in record["size"])
+        if "error" in record:
+            print("{:9}{:11}{:10}{:17}  {}".format(record["engine"], record["family"], size, record["phase"],
+                                                  record["error"]))
+        else:
+            print("{:9}{:11}{:10}{:17}{:>12.6f}{:>14}".format(record["engine"], record["family"], size,
+                                                               record["phase"], record["seconds"],
+                                                               record["peak_bytes"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark grammar table construction phases.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--families", nargs="+", default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per grammar, the best is kept")
+    parser.add_argument("--output", default="construct_bench.json", help="file to write results into")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown ratio in compare mode")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="phases faster than this are not compared in time")
+    args = parser.parse_args()
+
+    families = {family: FAMILIES[family][1] for family in args.families}
+    records = benchmark(args.engines, families, args.repeat)
+    print_records(records)
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "records": records}, file, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)["records"]
+        regressions = compare(records, baseline, args.threshold, args.min_seconds)
+        print()
+        if len(regressions) == 0:
+            print("No regression against {}.".format(args.compare))
+        else:
+            print("====Regressions against {}====".format(args.compare))
+            for message in regressions:
+                print(message)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
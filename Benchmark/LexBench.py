@@ -0,0 +1,136 @@
+"""
+Lexing source text into terminal symbols, built-in Lexer against the coding file round trip.
+
+The round trip writes the '(coding, token)' lexical analysis output file, reads it back with
+utils.load_coding and maps the codings with the coding table, like analyses fed by an external
+lexer. The direct path streams the source file through Lexer.terminal_series, the ids path
+through Lexer.terminal_ids into the symbol ids OperatorPriorityAn interns terminals into.
+Sources are random sentences of the operator priority grammar, one per line, with identifiers,
+numbers and comments.
+
+Usage:
+    python -m Benchmark.LexBench --lines 1000 10000
+"""
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from Benchmark.SyntheticGrammar import random_sentence
+from Lexer import Lexer
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from utils import get_description_map, load_coding, load_coding_table, load_grammar
+
+GRAMMAR_FILE = os.path.join("OperatorPriority", "data", "grammar.txt")
+
+
+def generate_source(file_name, line_count, seed):
+    """
+    Write a random source file.
+
+    :param file_name: str, file directory.
+    :param line_count: int, number of lines.
+    :param seed: int, random seed.
+    """
+    rng = random.Random(seed)
+    grammar = load_grammar(GRAMMAR_FILE)
+    with open(file_name, "w") as file:
+        for index in range(line_count):
+            tokens = []
+            for symbol in random_sentence(grammar, rng, rng.randint(5, 40)):
+                if symbol == "i":
+                    symbol = "v{}".format(rng.randrange(1000)) if rng.random() < 0.7 else str(rng.randrange(10 ** 6))
+                tokens.append(symbol)
+            line = " ".join(tokens)
+            if rng.random() < 0.1:
+                line += " // note {}".format(index)
+            elif rng.random() < 0.05:
+                line = "/* block\n   comment */ " + line
+            file.write(line + "\n")
+
+
+def round_trip(lexer, source_file, desc_map, symbol_ids):
+    """
+    :return: list, terminal symbols of source_file read back from a coding file.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        coding_file = os.path.join(directory, "coding.txt")
+        with open(source_file, "r") as file:
+            lexer.write_coding(file, coding_file)
+        # Drop the end symbol appended by load_coding.
+        return [desc_map[coding] for coding in load_coding(coding_file)[:-1]]
+
+
+def direct(lexer, source_file, desc_map, symbol_ids):
+    """
+    :return: list, terminal symbols of source_file streamed through the lexer.
+    """
+    with open(source_file, "r") as file:
+        return list(lexer.terminal_series(file))
+
+
+def ids(lexer, source_file, desc_map, symbol_ids):
+    """
+    :return: list, terminal ids of source_file streamed through the lexer.
+    """
+    with open(source_file, "r") as file:
+        return list(lexer.terminal_ids(file, symbol_ids))
+
+
+PATHS = {"round_trip": round_trip, "direct": direct, "ids": ids}
+
+
+def measure(function, repeat):
+    """
+    :param function: callable without arguments.
+    :param repeat: int, number of timed runs.
+    :return: tuple (object, float, int), the result, best seconds and peak bytes of one traced run.
+    """
+    best = None
+    for run in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the built-in lexer against the coding file round trip.")
+    parser.add_argument("--lines", nargs="+", type=int, default=[1000, 10000], help="source sizes in lines")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per path, the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lexer = Lexer()
+    desc_map = get_description_map(load_coding_table())
+    analyzer = OperatorPriorityAn(load_grammar(GRAMMAR_FILE))
+    print("{:8}{:12}{:>10}{:>12}{:>13}{:>14}".format("lines", "path", "tokens", "seconds", "tokens/s", "peak bytes"))
+    with tempfile.TemporaryDirectory() as directory:
+        for line_count in args.lines:
+            source_file = os.path.join(directory, "source.txt")
+            generate_source(source_file, line_count, args.seed)
+            results = dict()
+            for name, path in PATHS.items():
+                series, seconds, peak = measure(lambda: path(lexer, source_file, desc_map, analyzer.symbol_ids),
+                                                args.repeat)
+                results[name] = series
+                print("{:<8}{:12}{:>10}{:>12.4f}{:>13.0f}{:>14}".format(
+                    line_count, name, len(series), seconds, len(series) / seconds, peak))
+            names = [analyzer.symbol_names[symbol_id] for symbol_id in results["ids"]]
+            if not results["round_trip"] == results["direct"] == names:
+                print("Paths disagree on {} lines.".format(line_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+End to end parse throughput of the analyzers, replaying lexical coding arrays.
+
+Every sentence is held as a coding array, like the output of utils.load_coding.
+A replay maps the codings to terminal symbols with the 'secondary' column of coding.csv,
+then runs the analyzer on them. Sentences are either read from lexical analysis output files,
+or derived at random from the shipped grammar.txt files, valid ones and corrupted ones.
+
+Usage:
+    python -m Benchmark.ParseBench --lengths 5 20 100 --count 200
+    python -m Benchmark.ParseBench --coding-files output1.txt output2.txt --trace
+    python -m Benchmark.ParseBench --lengths 100 --profile profile
+    python -m Benchmark.ParseBench --engines operator --count 5000 --batch
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from Benchmark.SyntheticGrammar import corrupt_sentence, random_sentence
+from Instrumentation import ParseStats, Profiler
+from OperatorPriority.BatchAn import BatchAn
+from PreValidator import PreValidator
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from SimplePriority.SimplePriorityAn import SimplePriority
+from utils import get_description_map, load_coding, load_coding_table, load_grammar
+
+# Engine name -> (analyzer class, grammar file).
+ENGINES = {
+    "simple": (SimplePriority, os.path.join("SimplePriority", "data", "grammar.txt")),
+    "operator": (OperatorPriorityAn, os.path.join("OperatorPriority", "data", "grammar.txt")),
+}
+HASH_SEED = "0"
+
+
+def ensure_deterministic():
+    """
+    Run the benchmark under a fixed hash seed, restarting the interpreter if needed,
+    so dict and set ordering is the same on every run.
+    """
+    if not os.environ.get("PYTHONHASHSEED") == HASH_SEED:
+        env = dict(os.environ, PYTHONHASHSEED=HASH_SEED)
+        sys.exit(subprocess.call([sys.executable, "-m", "Benchmark.ParseBench"] + sys.argv[1:], env=env))
+
+
+def generate_codings(grammar, code_map, lengths, count, invalid, seed):
+    """
+    Derive random sentences and turn them into coding arrays.
+
+    :param grammar: Grammar, the grammar to derive from.
+    :param code_map: dict, terminal symbol -> coding.
+    :param lengths: list, sentence lengths.
+    :param count: int, number of sentences per length.
+    :param invalid: float, share of sentences to corrupt.
+    :param seed: int, random seed.
+    :return: dict, length -> list of coding arrays.
+    """
+    rng = random.Random(seed)
+    terminals = [symbol for symbol in grammar.symbols if symbol not in grammar.formulas]
+    for terminal in terminals:
+        if terminal not in code_map:
+            raise ValueError("Terminal symbol {} has no coding in coding table.".format(terminal))
+    result = dict()
+    for length in lengths:
+        codings = []
+        for index in range(count):
+            sentence = random_sentence(grammar, rng, length)
+            if rng.random() < invalid:
+                sentence = corrupt_sentence(sentence, rng, terminals)
+            codings.append([code_map[symbol] for symbol in sentence])
+        result[length] = codings
+    return result
+
+
+def read_codings(file_names):
+    """
+    :param file_names: list, lexical analysis output files.
+    :return: dict, length -> list of coding arrays, one array per file.
+    """
+    result = dict()
+    for file_name in file_names:
+        # Drop the end symbol appended by load_coding, analyzers append their own.
+        coding_array = load_coding(file_name)[:-1]
+        result.setdefault(len(coding_array), []).append(coding_array)
+    return result
+
+
+def replay(analyzer, start_symbol, codings, desc_map, trace, sink, prevalidator=None):
+    """
+    Map and parse every coding array once.
+
+    :param analyzer: SimplePriority or OperatorPriorityAn.
+    :param start_symbol: str, start symbol of grammar.
+    :param codings: list, coding arrays.
+    :param desc_map: dict, coding -> terminal symbol.
+    :param trace: bool, whether the analyzer prints its analysis process.
+    :param sink: file object receiving the printed analysis process.
+    :param prevalidator: PreValidator, optional, checks the whole set at once before the analyses,
+        only the series passing it are analyzed. The check time is shared evenly among sentences.
+    :return: tuple (list, float, int), latency of every sentence in seconds,
+        seconds spent in mapping, number of accepted sentences.
+    """
+    if prevalidator is not None:
+        return replay_prevalidated(analyzer, start_symbol, codings, desc_map, trace, sink, prevalidator)
+    latencies = []
+    map_seconds = 0.0
+    accepted = 0
+    perf_counter = time.perf_counter
+    with contextlib.redirect_stdout(sink):
+        for coding_array in codings:
+            start = perf_counter()
+            series = [desc_map[coding] for coding in coding_array]
+            mapped = perf_counter()
+            try:
+                analyzer.control(start_symbol, series, trace=trace)
+                accepted += 1
+            except (KeyError, ValueError, IndexError):
+                pass
+            end = perf_counter()
+            map_seconds += mapped - start
+            latencies.append(end - start)
+    return latencies, map_seconds, accepted
+
+
+def replay_prevalidated(analyzer, start_symbol, codings, desc_map, trace, sink, prevalidator):
+    """
+    replay with the whole set mapped and checked by prevalidator first.
+    """
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    batch = [[desc_map[coding] for coding in coding_array] for coding_array in codings]
+    mapped = perf_counter()
+    survivors, rejected = prevalidator.split(batch)
+    share = (perf_counter() - mapped) / max(len(batch), 1)
+    map_seconds = mapped - start
+    latencies = [map_seconds / max(len(batch), 1) + share] * len(batch)
+    accepted = 0
+    with contextlib.redirect_stdout(sink):
+        for index in survivors:
+            start = perf_counter()
+            try:
+                analyzer.control(start_symbol, batch[index], trace=trace)
+                accepted += 1
+            except (KeyError, ValueError, IndexError):
+                pass
+            latencies[index] += perf_counter() - start
+    return latencies, map_seconds, accepted
+
+
+def replay_batched(batch_an, codings, desc_map):
+    """
+    replay with the whole set mapped and analyzed in lockstep by batch_an.
+    The time is shared evenly among sentences.
+    """
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    batch = [[desc_map[coding] for coding in coding_array] for coding_array in codings]
+    mapped = perf_counter()
+    result = batch_an.analyze(batch)
+    end = perf_counter()
+    return [(end - start) / max(len(batch), 1)] * len(batch), mapped - start, int(result.accepted.sum())
+
+
+def benchmark(engines, sources, desc_map, trace, repeat, profile=None, unit_chains=False, prevalidate=False,
+              batch=False):
+    """
+    :param engines: list, engine names in ENGINES.
+    :param sources: dict, engine name -> (length -> coding arrays).
+    :param desc_map: dict, coding -> terminal symbol.
+    :param trace: bool, whether the analyzers print their analysis process.
+    :param repeat: int, number of replays, the fastest is reported.
+    :param profile: str, optional, after the timed replays, replay every set once more under
+        Instrumentation.Profiler, print its report and write its collapsed stacks into '{profile}.{engine}.folded'.
+    :param unit_chains: bool, whether analyzers supporting it apply precomputed unit reduction chains,
+        saving the leftmost phrase searches of unit reductions. The reductions themselves are unchanged.
+    :param prevalidate: bool, whether to reject series with unrelated adjacent symbols before the analyses.
+    :param batch: bool, whether to analyze every set in lockstep with OperatorPriority.BatchAn,
+        for the operator engine without trace.
+    :return: list, one record per (engine, length).
+    """
+    records = []
+    with open(os.devnull, "w") as sink:
+        for engine in engines:
+            analyzer_class, grammar_file = ENGINES[engine]
+            grammar = load_grammar(grammar_file)
+            analyzer = analyzer_class(grammar)
+            start_symbol = grammar.non_ts[0]
+            if unit_chains and hasattr(analyzer, "build_unit_chains"):
+                analyzer.build_unit_chains(start_symbol)
+            prevalidator = PreValidator(analyzer.form_matrix) if prevalidate else None
+            batch_an = BatchAn(grammar, analyzer.form_matrix) if batch and engine == "operator" and not trace else None
+            for length, codings in sorted(sources[engine].items()):
+                best = None
+                for run in range(repeat):
+                    gc.collect()
+                    gc.disable()
+                    try:
+                        if batch_an is not None:
+                            result = replay_batched(batch_an, codings, desc_map)
+                        else:
+                            result = replay(analyzer, start_symbol, codings, desc_map, trace, sink, prevalidator)
+                    finally:
+                        gc.enable()
+                    if best is None or sum(result[0]) < sum(best[0]):
+                        best = result
+                latencies, map_seconds, accepted = best
+                total = sum(latencies)
+                # Count reductions and leftmost phrase searches in one more replay, outside the timed ones.
+                counters = ParseStats()
+                if batch_an is None:
+                    analyzer.stats = counters
+                    replay(analyzer, start_symbol, codings, desc_map, trace, sink, prevalidator)
+                    analyzer.stats = None
+                tokens = sum(len(coding_array) for coding_array in codings)
+                records.append({
+                    "engine": engine, "length": length, "trace": trace, "sentences": len(codings),
+                    "tokens": tokens, "accepted": accepted, "seconds": total, "map_seconds": map_seconds,
+                    "tokens_per_second": tokens / total, "sentences_per_second": len(codings) / total,
+                    "p50_us": float(np.percentile(latencies, 50)) * 1e6,
+                    "p99_us": float(np.percentile(latencies, 99)) * 1e6, "batch": batch_an is not None,
+                    "reductions": counters.reductions, "handle_searches": counters.handle_searches})
+            if profile is not None:
+                analyzer.profiler = Profiler(analyzer.productions)
+                for length, codings in sorted(sources[engine].items()):
+                    replay(analyzer, start_symbol, codings, desc_map, trace, sink)
+                print("====Profile of {}====".format(engine))
+                analyzer.profiler.print_report(limit=20)
+                analyzer.profiler.write_collapsed("{}.{}.folded".format(profile, engine))
+                analyzer.profiler = None
+    return records
+
+
+def print_records(records):
+    print("{:9}{:>7}{:>6}{:>10}{:>9}{:>13}{:>12}{:>10}{:>10}{:>8}{:>11}{:>10}".format(
+        "engine", "length", "trace", "sentences", "accepted", "tokens/s", "sentences/s", "p50 us", "p99 us",
+        "map %", "reductions", "searches"))
+    for record in records:
+        print("{:9}{:>7}{:>6}{:>10}{:>9}{:>13.0f}{:>12.0f}{:>10.1f}{:>10.1f}{:>8.1f}{:>11}{:>10}".format(
+            record["engine"], record["length"], str(record["trace"]), record["sentences"], record["accepted"],
+            record["tokens_per_second"], record["sentences_per_second"], record["p50_us"], record["p99_us"],
+            100 * record["map_seconds"] / record["seconds"], record["reductions"], record["handle_searches"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end to end parse throughput.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--coding-files", nargs="+", help="lexical analysis output files to replay")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[5, 20, 100], help="generated sentence lengths")
+    parser.add_argument("--count", type=int, default=200, help="generated sentences per length")
+    parser.add_argument("--invalid", type=float, default=0.5, help="share of generated sentences to corrupt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="replays per set, the fastest is reported")
+    parser.add_argument("--trace", action="store_true", help="let analyzers print the analysis process")
+    parser.add_argument("--cpu", type=int, help="pin the process to one cpu")
+    parser.add_argument("--output", default="parse_bench.json", help="file to write results into")
+    parser.add_argument("--unit-chains", action="store_true",
+                        help="apply precomputed unit reduction chains without leftmost phrase searches where supported")
+    parser.add_argument("--prevalidate", action="store_true",
+                        help="reject series with unrelated adjacent symbols before the analyses")
+    parser.add_argument("--batch", action="store_true", help="analyze operator priority sets in lockstep")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="profile one more replay, writing collapsed stacks into PREFIX.<engine>.folded")
+    args = parser.parse_args()
+
+    ensure_deterministic()
+    if args.cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {args.cpu})
+
+    desc_map = get_description_map(load_coding_table())
+    code_map = dict()
+    for coding, desc in sorted(desc_map.items()):
+        code_map.setdefault(desc, coding)
+
+    sources = dict()
+    for engine in args.engines:
+        if args.coding_files is not None:
+            sources[engine] = read_codings(args.coding_files)
+        else:
+            sources[engine] = generate_codings(load_grammar(ENGINES[engine][1]), code_map, args.lengths,
+                                               args.count, args.invalid, args.seed)
+
+    records = benchmark(args.engines, sources, desc_map, args.trace, args.repeat, args.profile, args.unit_chains,
+                        args.prevalidate, args.batch)
+    print_records(records)
+    with open(args.output, "w") as file:
+        json.dump({"environment": {"python": sys.version, "platform": platform.platform(),
+                                   "hash_seed": HASH_SEED, "seed": args.seed, "cpu": args.cpu},
+                   "records": records}, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
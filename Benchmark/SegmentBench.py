@@ -0,0 +1,141 @@
+"""
+Validating one long coding array, a single serial analysis per statement against segmented parsing.
+
+The source is a generated coding array of random sentences of the shipped grammar.txt files,
+each followed by ';', like a long generated program of expression statements. Some statements
+are grouped into top-level brace blocks '{ s ; s ; }', which the grammars reject at the '{'.
+The reference parses the whole array statement by statement in one loop, over the statement
+bounds known from generation, so it does not depend on SegmentedParse.split_segments. It is
+only compared with a source without corrupted statements. Serial and pooled
+SegmentedParse.SegmentedParser runs must report the same segments, errors and logs.
+
+Usage:
+    python -m Benchmark.SegmentBench --statements 20000 --blocks 0.05 --workers 1 2 4
+"""
+import argparse
+import random
+import time
+
+from Benchmark.ParseBench import ENGINES
+from Benchmark.SyntheticGrammar import corrupt_sentence, random_sentence
+from ParseTree import ReductionLog
+from SegmentedParse import CLOSERS, DELIMITERS, END_CODING, OPENERS, SegmentedParser, parse_segments
+from utils import get_description_map, load_coding_table, load_grammar
+
+
+def generate_source(grammar, code_map, statements, invalid, blocks, seed):
+    """
+    :param blocks: float, share of statements starting a brace block of one to three statements.
+    :return: tuple (list, list), coding array of statements ending with ';' or blocks ending with '}',
+        and the end coding, and the (start, end) bounds of every top-level statement or block,
+        the '}' of a block included.
+    """
+    rng = random.Random(seed)
+    terminals = [symbol for symbol in grammar.symbols if symbol not in grammar.formulas]
+    coding_array = []
+    bounds = []
+    count = 0
+    while count < statements:
+        start = len(coding_array)
+        block = rng.random() < blocks
+        if block:
+            coding_array.append(OPENERS[1])
+        for index in range(rng.randint(1, 3) if block else 1):
+            sentence = random_sentence(grammar, rng, rng.randint(5, 40))
+            if rng.random() < invalid:
+                sentence = corrupt_sentence(sentence, rng, terminals)
+            coding_array += [code_map[symbol] for symbol in sentence]
+            if not block:
+                bounds.append((start, len(coding_array)))
+            coding_array.append(DELIMITERS[0])
+            count += 1
+        if block:
+            coding_array.append(CLOSERS[1])
+            bounds.append((start, len(coding_array)))
+    coding_array.append(END_CODING)
+    return coding_array, bounds
+
+
+def reference_parse(analyzer, desc_map, start_symbol, coding_array, bounds):
+    """
+    Parse the whole array statement by statement over the generated bounds.
+
+    :return: tuple (dict, ReductionLog), errors as in SegmentedParse.SegmentedResult and all reductions.
+    """
+    log = ReductionLog()
+    errors = dict()
+    outcome = parse_segments(analyzer, desc_map, start_symbol, coding_array, 0, bounds, True)
+    for index, (position, message, reductions) in enumerate(outcome):
+        if position >= 0:
+            errors[index] = (position, message)
+        if reductions is not None:
+            log.data.extend(reductions)
+    return errors, log
+
+
+def measure(parser, coding_array, repeat):
+    """
+    :return: tuple (SegmentedResult, float), the result and the best seconds.
+    """
+    best = None
+    for run in range(repeat):
+        start = time.perf_counter()
+        result = parser.parse(coding_array)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmented parsing of a long coding array.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--statements", type=int, default=20000)
+    parser.add_argument("--invalid", type=float, default=0.0,
+                        help="share of corrupted statements, an unclosed '(' merges all statements after it")
+    parser.add_argument("--blocks", type=float, default=0.05, help="share of statements starting a brace block")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["thread", "process"], choices=["thread", "process"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    coding_df = load_coding_table()
+    desc_map = get_description_map(coding_df)
+    code_map = dict()
+    for coding, desc in desc_map.items():
+        code_map.setdefault(desc, coding)
+
+    print("{:10}{:10}{:>8}{:>10}{:>12}{:>14}{:>9}".format(
+        "engine", "mode", "workers", "tokens", "seconds", "tokens/s", "errors"))
+    for engine in args.engines:
+        analyzer_class, grammar_file = ENGINES[engine]
+        grammar = load_grammar(grammar_file)
+        analyzer = analyzer_class(grammar)
+        coding_array, bounds = generate_source(grammar, code_map, args.statements, args.invalid, args.blocks,
+                                               args.seed)
+        start_symbol = grammar.non_ts[0]
+        errors, log = reference_parse(analyzer, desc_map, start_symbol, coding_array, bounds)
+
+        with SegmentedParser(analyzer.form_matrix, start_symbol, desc_map, mode="serial") as serial:
+            expected, seconds = measure(serial, coding_array, args.repeat)
+        print("{:10}{:10}{:>8}{:>10}{:>12.4f}{:>14.0f}{:>9}".format(
+            engine, "serial", 1, len(coding_array), seconds, len(coding_array) / seconds, len(expected.errors)))
+        # A corrupted statement may gain or lose a bracket, which moves the segment bounds away from the
+        # generated ones, so only a valid source is checked against the reference.
+        if args.invalid == 0 and not (list(zip(expected.starts.tolist(), expected.ends.tolist())) == bounds
+                                      and expected.errors == errors and expected.log.data == log.data):
+            print("Segmented parsing disagrees with parsing the whole array statement by statement.")
+        for mode in args.modes:
+            for workers in args.workers:
+                with SegmentedParser(analyzer.form_matrix, start_symbol, desc_map, mode, workers) as segmented:
+                    # Start the pool outside the timed runs.
+                    segmented.parse(coding_array[:1])
+                    result, seconds = measure(segmented, coding_array, args.repeat)
+                print("{:10}{:10}{:>8}{:>10}{:>12.4f}{:>14.0f}{:>9}".format(
+                    engine, mode, workers, len(coding_array), seconds, len(coding_array) / seconds, len(result.errors)))
+                if not (result.errors == expected.errors and result.log.data == expected.log.data):
+                    print("{} mode with {} workers disagrees with serial parsing.".format(mode, workers))
+
+
+if __name__ == "__main__":
+    main()
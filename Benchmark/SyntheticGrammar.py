@@ -0,0 +1,146 @@
+from Grammar import Grammar
+
+
+def expression_grammar(levels, operators):
+    """
+    Expression grammar with a ladder of precedence levels, like
+    E0 -> E0 o0_0 E1 | E1, ..., E{levels} -> ( E0 ) | i.
+
+    :param levels: int, number of precedence levels.
+    :param operators: int, number of binary operators on every level.
+    :return: Grammar.
+    """
+    grammar = Grammar()
+    for level in range(levels):
+        non_t = "E{}".format(level)
+        lower = "E{}".format(level + 1)
+        for operator in range(operators):
+            grammar.add_production(non_t, [non_t, "o{}_{}".format(level, operator), lower])
+        grammar.add_production(non_t, [lower])
+    atom = "E{}".format(levels)
+    grammar.add_production(atom, ["(", "E0", ")"])
+    grammar.add_production(atom, ["i"])
+    return grammar
+
+
+def wide_grammar(width):
+    """
+    Flat grammar with many alternatives on the start symbol, like
+    S -> a0 A0 b0 | a1 A1 b1 | ..., A0 -> c0, A1 -> c1, ...
+
+    :param width: int, number of alternatives of the start symbol.
+    :return: Grammar.
+    """
+    grammar = Grammar()
+    for index in range(width):
+        grammar.add_production("S", ["a{}".format(index), "A{}".format(index), "b{}".format(index)])
+    for index in range(width):
+        grammar.add_production("A{}".format(index), ["c{}".format(index)])
+    return grammar
+
+
+def chain_grammar(depth):
+    """
+    Grammar made of a deep unit chain, like E0 -> E1, ..., E{depth} -> ( E0 ) | i.
+
+    :param depth: int, number of unit formulas in the chain.
+    :return: Grammar.
+    """
+    grammar = Grammar()
+    for level in range(depth):
+        grammar.add_production("E{}".format(level), ["E{}".format(level + 1)])
+    atom = "E{}".format(depth)
+    grammar.add_production(atom, ["(", "E0", ")"])
+    grammar.add_production(atom, ["i"])
+    return grammar
+
+
+# Grammar family name -> (generator, default sizes). A size is the tuple of generator arguments.
+FAMILIES = {
+    "expression": (expression_grammar, [(2, 2), (4, 2), (4, 4), (8, 4)]),
+    "wide": (wide_grammar, [(8,), (16,), (32,), (64,)]),
+    "chain": (chain_grammar, [(2,), (4,), (8,), (12,)]),
+}
+
+
+def min_lengths(grammar):
+    """
+    Length of the shortest terminal string every symbol derives.
+
+    :param grammar: Grammar.
+    :return: dict, symbol -> shortest length, non-terminals deriving no terminal string are left out.
+    """
+    result = {symbol: 1 for symbol in grammar.symbols if symbol not in grammar.formulas}
+    changed = True
+    while changed:
+        changed = False
+        for non_t, formula in grammar.productions:
+            chars = formula.split(" ")
+            if all(char in result for char in chars):
+                length = sum(result[char] for char in chars)
+                if length < result.get(non_t, length + 1):
+                    result[non_t] = length
+                    changed = True
+    return result
+
+
+def random_sentence(grammar, rng, length, start_symbol=None):
+    """
+    Derive a random sentence of about the given length, by leftmost derivation.
+    Formulas are chosen at random, mostly growing ones, until the sentence would grow
+    past length, then the shortest formulas are chosen to finish it.
+
+    :param grammar: Grammar.
+    :param rng: random.Random, source of randomness.
+    :param length: int, the wanted number of tokens.
+    :param start_symbol: str, default to the first non-terminal of grammar.
+    :return: list, terminal symbols of the sentence.
+    """
+    shortest = min_lengths(grammar)
+    if start_symbol is None:
+        start_symbol = grammar.non_ts[0]
+    sentence = []
+    pending = [start_symbol]
+    # Length the pending symbols derive at least.
+    pending_length = shortest[start_symbol]
+    while len(pending) > 0:
+        symbol = pending.pop()
+        pending_length -= shortest[symbol]
+        if symbol not in grammar.formulas:
+            sentence.append(symbol)
+            continue
+        formulas = [formula.split(" ") for formula in grammar.formulas[symbol]]
+        formulas = [chars for chars in formulas if all(char in shortest for char in chars)]
+        sizes = [sum(shortest[char] for char in chars) for chars in formulas]
+        if len(sentence) + pending_length + shortest[symbol] < length:
+            # Prefer formulas which grow the sentence, but keep some chance to stop early.
+            growing = [chars for chars, size in zip(formulas, sizes) if size > shortest[symbol]]
+            if len(growing) > 0 and rng.random() < 0.75:
+                formulas = growing
+            chars = rng.choice(formulas)
+        else:
+            chars = formulas[sizes.index(min(sizes))]
+        pending.extend(reversed(chars))
+        pending_length += sum(shortest[char] for char in chars)
+    return sentence
+
+
+def corrupt_sentence(sentence, rng, terminals):
+    """
+    Make a sentence most likely invalid, by deleting, inserting or replacing one token.
+
+    :param sentence: list, terminal symbols of a valid sentence.
+    :param rng: random.Random, source of randomness.
+    :param terminals: list, terminal symbols to insert from.
+    :return: list, the corrupted sentence.
+    """
+    sentence = list(sentence)
+    position = rng.randrange(len(sentence))
+    action = rng.randrange(3)
+    if action == 0 and len(sentence) > 1:
+        del sentence[position]
+    elif action == 1:
+        sentence.insert(position, rng.choice(terminals))
+    else:
+        sentence[position] = rng.choice([t for t in terminals if not t == sentence[position]])
+    return sentence
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class DerivedTable:
+    """
+    A table of a FormMatrix computed from other tables on first access, then cached in the instance.
+
+    Use it as a decorator on the method computing the table, naming the build phase and the
+    tables the method reads. On first access the tables it depends on are built first, each in
+    its own phase, then the method runs inside self.stats.phase, so a phase only times its own
+    work and BuildStats never sees nested phases. The value is stored in the instance dict,
+    which takes precedence over this descriptor, so later accesses are plain attribute reads.
+    For the same reason a table can be provided before first access by assigning it, e.g.
+    f/g functions loaded from a cache, and the tables only it depends on are never built.
+
+    :param phase: str, name of the build phase recorded in BuildStats.
+    :param depends: tuple, names of the tables the method reads.
+    """
+
+    def __init__(self, phase, depends=()):
+        self.phase = phase
+        self.depends = tuple(depends)
+        self.function = None
+        self.name = None
+
+    def __call__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        for name in self.depends:
+            getattr(instance, name)
+        with instance.stats.phase(self.phase) as phase:
+            value = self.function(instance)
+            phase.shape = np.shape(value)
+        instance.__dict__[self.name] = value
+        return value
+
+
+def dependency_graph(cls):
+    """
+    :param cls: class, with DerivedTable attributes.
+    :return: dict, table name -> names of the tables it depends on, in the order the tables are defined.
+    """
+    graph = dict()
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, DerivedTable):
+                graph[name] = value.depends
+    return graph
+
+
+def build_order(cls, names=None):
+    """
+    :param cls: class, with DerivedTable attributes.
+    :param names: list, names of the wanted tables, default to all.
+    :return: list, the wanted tables and all tables they depend on, every table after its dependencies.
+    :raise ValueError: When a name is not a derived table of cls, or the dependencies form a cycle.
+    """
+    graph = dependency_graph(cls)
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name not in graph:
+            raise ValueError("{} is not a derived table of {}.".format(name, cls.__name__))
+        if name in visiting:
+            raise ValueError("Derived table {} of {} depends on itself.".format(name, cls.__name__))
+        visiting.add(name)
+        for dependency in graph[name]:
+            visit(dependency)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in (graph if names is None else names):
+        visit(name)
+    return order
@@ -0,0 +1,160 @@
+class GrammarError(ValueError):
+    """
+    Raised when a grammar text can not be parsed, carrying the source and line number.
+    """
+
+    def __init__(self, message, source="<text>", line_number=None):
+        self.source = source
+        self.line_number = line_number
+        if line_number is not None:
+            message = "{}:{}: {}".format(source, line_number, message)
+        super().__init__(message)
+
+
+class Grammar:
+    """
+    Grammar formulas with all symbols interned into integer ids.
+
+    Symbols get ids in the order they first appear. prod_lhs and prod_rhs hold the symbol ids
+    of every production, and productions holds the same productions as (non-terminal, formula)
+    string tuples, formula symbols separated by one space. The production id of a formula is its
+    position in these lists. non_ts keeps the non-terminal symbols in the order of their first
+    formula, so the first one is the start symbol.
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self.symbol_ids = dict()
+        self.non_ts = []
+        self.productions = []
+        self.prod_lhs = []
+        self.prod_rhs = []
+        # non-terminal symbol -> list of its formulas.
+        self.formulas = dict()
+
+    def __len__(self):
+        return len(self.productions)
+
+    def intern(self, symbol):
+        """
+        :param symbol: str, grammar symbol.
+        :return: int, id of the symbol, a new id is assigned if the symbol is not seen before.
+        """
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def add_production(self, non_t, chars):
+        """
+        Append one production.
+
+        :param non_t: str, the non-terminal symbol.
+        :param chars: list, symbols of the formula.
+        :return: int, production id.
+        """
+        formula = " ".join(chars)
+        formulas = self.formulas.get(non_t)
+        if formulas is None:
+            formulas = self.formulas[non_t] = []
+            self.non_ts.append(non_t)
+        formulas.append(formula)
+        self.productions.append((non_t, formula))
+        self.prod_lhs.append(self.intern(non_t))
+        self.prod_rhs.append(tuple([self.intern(char) for char in chars]))
+        return len(self.productions) - 1
+
+    def add_line(self, line, source="<text>", line_number=None):
+        """
+        Parse one 'A -> a | b c' line. Empty lines are ignored.
+
+        :param line: str, the line to parse.
+        :param source: str, name of the grammar source, used in error messages.
+        :param line_number: int, number of the line, used in error messages.
+        :raise GrammarError: When the line is not a valid formula line.
+        """
+        if len(line.strip()) == 0:
+            return
+        non_t, arrow, formulas = line.partition("->")
+        if len(arrow) == 0:
+            raise GrammarError("missing '->' in {!r}".format(line), source, line_number)
+        non_t = non_t.strip()
+        if len(non_t) == 0 or len(non_t.split()) > 1:
+            raise GrammarError("left side must be one non-terminal symbol, got {!r}".format(non_t),
+                               source, line_number)
+        for alternative, formula in enumerate(formulas.split("|")):
+            chars = formula.split()
+            if len(chars) == 0:
+                raise GrammarError("formula {} of {} is empty".format(alternative + 1, non_t), source, line_number)
+            self.add_production(non_t, chars)
+
+    @classmethod
+    def from_lines(cls, lines, source="<text>"):
+        """
+        Build grammar from lines of 'A -> a | b c' formulas.
+
+        :param lines: iterable, containing grammar lines.
+        :param source: str, name of the grammar source, used in error messages.
+        :return: Grammar.
+        """
+        grammar = cls()
+        for line_number, line in enumerate(lines, 1):
+            grammar.add_line(line.rstrip("\n"), source, line_number)
+        return grammar
+
+    @classmethod
+    def from_file(cls, file_name):
+        """
+        Stream a plain text grammar file line by line.
+
+        :param file_name: str, grammar file directory.
+        :return: Grammar.
+        """
+        with open(file_name, "r") as file:
+            return cls.from_lines(file, source=file_name)
+
+    @classmethod
+    def from_dataframe(cls, grammar_df):
+        """
+        Build grammar from a data frame created by utils.init_grammar.
+
+        :param grammar_df: pandas data frame, indexed by non-terminal symbols with a 'formula' column.
+        :return: Grammar.
+        """
+        grammar = cls()
+        for non_t, formula in zip(grammar_df.index, grammar_df["formula"]):
+            grammar.add_production(str(non_t).strip(), str(formula).split())
+        return grammar
+
+    def to_dataframe(self):
+        """
+        :return: pandas data frame, indexed by non-terminal symbols with a 'formula' column.
+        """
+        import pandas as pd
+
+        return pd.DataFrame([formula for non_t, formula in self.productions],
+                            index=[non_t for non_t, formula in self.productions], columns=["formula"])
+
+    def get_all_formulas(self, non_t):
+        """
+        Returns all formulas corresponding to the specified non-terminal symbol.
+
+        :param non_t: string, the non-terminal symbol.
+        :return: list, all formulas corresponding to the specified non-terminal symbol.
+        :raise KeyError: When non_t has no formula.
+        """
+        return self.formulas[non_t]
+
+
+def as_grammar(grammar):
+    """
+    Accept either a Grammar or a grammar data frame.
+
+    :param grammar: Grammar or pandas data frame.
+    :return: Grammar.
+    """
+    if isinstance(grammar, Grammar):
+        return grammar
+    return Grammar.from_dataframe(grammar)
@@ -0,0 +1,229 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from ParseCache import CachedResult
+from ParseTree import ReductionLog
+
+
+class IncrementalParser:
+    """
+    Re-analysis of an edited input series, resuming from checkpoints of the previous analysis.
+
+    An analysis records a checkpoint, the input position, a copy of the analysis state and the
+    log length, every interval or more tokens (see the resume method of the analyzers). The
+    state at a position depends only on the tokens before it, so after an edit of tokens
+    [start, end) the analysis resumes from the last checkpoint at or before start. Past the
+    edit it compares its state at every shift with the checkpoint of the previous analysis at
+    the same token: once the stacks hold the same symbols covering the same tokens, the rest of
+    the previous analysis repeats with positions moved by the edit, so its reductions, later
+    checkpoints and outcome are reused instead of being analyzed again.
+
+    Checkpoint positions and log lengths are numpy arrays moved by one vectorized addition.
+    Span starts in the states of reused checkpoints are moved lazily: every edit changing the
+    series length is recorded, and a checkpoint catches up with the edits after its version
+    when it is used. The work in the analyzer grows with the distance from the checkpoint
+    before the edit to the point the stacks line up again.
+
+    :param analyzer: OperatorPriorityAn or SimplePriority.
+    :param start_symbol: str, start symbol of grammar.
+    :param interval: int, least number of tokens between two checkpoints.
+    """
+
+    def __init__(self, analyzer, start_symbol, interval=32):
+        self.analyzer = analyzer
+        self.start_symbol = start_symbol
+        self.interval = interval
+        # Operator priority analysis rejects a series holding a non-terminal before analyzing it.
+        self.terminals = set(analyzer.ts) if hasattr(analyzer, "non_t_base") else None
+        self.series = ["#"]
+        self.invalid = []
+        self.log = ReductionLog()
+        # (start, end, length change) of every edit changing the series length.
+        self.edits = []
+        self.clear_checkpoints()
+        self.result = None
+        # Tokens analyzed by the last parse or reparse, up to its end or the point it lined up.
+        self.analyzed = 0
+
+    @property
+    def accepted(self):
+        return self.result.accepted
+
+    @property
+    def scan_index(self):
+        return self.result.scan_index
+
+    def check(self):
+        """
+        :raise: The error of the last analysis, if it rejected its input series.
+        """
+        self.result.replay()
+
+    def clear_checkpoints(self):
+        self.positions = np.zeros(0, np.int64)
+        self.log_lengths = np.zeros(0, np.int64)
+        self.states = []
+        # Number of edits the span starts of every state have caught up with.
+        self.versions = np.zeros(0, np.int64)
+
+    def get_state(self, index, version=None):
+        """
+        :param index: int, checkpoint index.
+        :param version: int, number of edits to catch up with, default to all.
+        :return: tuple, state of the checkpoint with span starts moved by the edits.
+        """
+        if version is None:
+            version = len(self.edits)
+        state = self.states[index]
+        if self.versions[index] < version:
+            spans = state[-1]
+            for start, end, delta in self.edits[self.versions[index]:version]:
+                # Span starts are increasing, and none of a live checkpoint is inside an edit.
+                cut = bisect_left(spans, end)
+                spans = spans[:cut] + [span + delta for span in spans[cut:]]
+            state = state[:-1] + (spans,)
+            if version == len(self.edits):
+                self.states[index] = state
+                self.versions[index] = version
+        return state
+
+    def parse(self, series):
+        """
+        Analyze a whole input series.
+
+        :param series: list, input identifier series, without the ending '#'.
+        :return: bool, whether the series is accepted.
+        """
+        self.series = list(series) + ["#"]
+        if self.terminals is not None:
+            self.invalid = [index for index, symbol in enumerate(series) if symbol not in self.terminals]
+        self.edits = []
+        self.clear_checkpoints()
+        self.run_from(0)
+        return self.result.accepted
+
+    def run_from(self, index, sync=None, sync_from=0):
+        """
+        Analyze self.series from checkpoint index on, dropping the reductions after it.
+        self.result is set, and the checkpoints after index replaced, unless the analysis stops by sync.
+
+        :return: tuple (bool, list), whether the analysis stopped by sync,
+            and the new checkpoints as (position, state, log length) tuples.
+        """
+        self.analyzed = 0
+        if len(self.invalid) > 0:
+            position = self.invalid[0]
+            self.log.clear()
+            self.clear_checkpoints()
+            self.result = CachedResult(False, position, ValueError,
+                                       ("'{}' is not a terminal symbol of grammar.".format(self.series[position]),))
+            return False, []
+        if len(self.states) == 0:
+            self.positions = np.zeros(1, np.int64)
+            self.log_lengths = np.zeros(1, np.int64)
+            self.states = [self.analyzer.initial_state()]
+            self.versions = np.full(1, len(self.edits), np.int64)
+            index = 0
+        position = int(self.positions[index])
+        log_length = int(self.log_lengths[index])
+        state = self.get_state(index)
+        del self.log.data[3 * log_length:]
+        checkpoints = [(position, state, log_length)]
+        analyzer = self.analyzer
+        try:
+            synced = analyzer.resume(self.start_symbol, self.series, position, tuple(list(item) for item in state),
+                                     self.log, checkpoints, self.interval, sync, sync_from)
+        except (KeyError, ValueError, IndexError) as e:
+            self.result = CachedResult(False, analyzer.scan_index, type(e), e.args)
+            synced = False
+        else:
+            if not synced:
+                self.result = CachedResult(True, analyzer.scan_index)
+        self.analyzed = analyzer.scan_index - position
+        if not synced:
+            self.splice(index, checkpoints[1:])
+        return synced, checkpoints[1:]
+
+    def splice(self, index, checkpoints, found=None, delta=0, log_shift=0):
+        """
+        Keep the checkpoints up to index, followed by new ones,
+        and by the previous ones from found on, moved by delta tokens and log_shift reductions, if found is given.
+        """
+        rest = slice(found, None) if found is not None else slice(0, 0)
+        self.positions = np.concatenate((self.positions[:index + 1],
+                                         np.array([c[0] for c in checkpoints], np.int64),
+                                         self.positions[rest] + delta))
+        self.log_lengths = np.concatenate((self.log_lengths[:index + 1],
+                                           np.array([c[2] for c in checkpoints], np.int64),
+                                           self.log_lengths[rest] + log_shift))
+        self.versions = np.concatenate((self.versions[:index + 1],
+                                        np.full(len(checkpoints), len(self.edits), np.int64),
+                                        self.versions[rest]))
+        self.states = self.states[:index + 1] + [c[1] for c in checkpoints] + self.states[rest]
+
+    def reparse(self, edit):
+        """
+        Analyze the series again after an edit.
+
+        :param edit: tuple (int, int, list), replace tokens [start, end) of the series with the token list.
+        :return: bool, whether the edited series is accepted.
+        """
+        start, end, tokens = edit
+        if not 0 <= start <= end < len(self.series):
+            raise ValueError("Edit [{}, {}) is out of input series of length {}.".format(start, end, len(self.series) - 1))
+        tokens = list(tokens)
+        delta = len(tokens) - (end - start)
+        self.series[start:end] = tokens
+        if self.terminals is not None:
+            self.invalid = ([index for index in self.invalid if index < start]
+                            + [start + i for i, symbol in enumerate(tokens) if symbol not in self.terminals]
+                            + [index + delta for index in self.invalid if index >= end])
+        if self.result is None or len(self.states) == 0:
+            self.run_from(0)
+            return self.result.accepted
+        # Number of edits the previous analysis has seen.
+        version = len(self.edits)
+        if not delta == 0:
+            self.edits.append((start, end, delta))
+
+        old_positions = self.positions.tolist()
+        old_result = self.result
+        index = int(np.searchsorted(self.positions, start, side="right")) - 1
+        base_length = int(self.log_lengths[index])
+        old_tail = self.log.data[3 * base_length:]
+        matched = []
+
+        def sync(position, stack, span_starts):
+            # Checkpoint of the previous analysis at the same token, if any.
+            old_position = position - delta
+            found = bisect_left(old_positions, old_position, index + 1)
+            if found == len(old_positions) or not old_positions[found] == old_position:
+                return False
+            old_stack, old_spans = self.states[found][0], self.get_state(found, version)[-1]
+            if not (len(old_stack) == len(stack) and old_stack == stack):
+                return False
+            for span, new_span in zip(old_spans, span_starts):
+                if not (span == new_span if span < start else span >= end and span + delta == new_span):
+                    return False
+            matched.append(found)
+            return True
+
+        synced, checkpoints = self.run_from(index, sync, start + len(tokens))
+        if not synced:
+            return self.result.accepted
+
+        # Reuse the rest of the previous analysis from the checkpoint the stacks lined up at.
+        found = matched[0]
+        old_log_length = int(self.log_lengths[found])
+        log_shift = len(self.log) - old_log_length
+        tail = np.frombuffer(old_tail, dtype=np.int32).reshape(-1, 3)[old_log_length - base_length:]
+        if len(tail) > 0:
+            tail = tail.copy()
+            spans = tail[:, 1:]
+            spans[spans >= end] += delta
+            self.log.data.frombytes(tail.tobytes())
+        self.splice(index, checkpoints, found, delta, log_shift)
+        self.result = CachedResult(old_result.accepted, old_result.scan_index + delta,
+                                   old_result.error_type, old_result.error_args)
+        return self.result.accepted
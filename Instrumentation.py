@@ -0,0 +1,299 @@
+import time
+import tracemalloc
+
+
+class PhaseStats:
+    """
+    Statistics of one table construction phase, also the context manager timing it.
+    iterations counts the phase's own loop steps, like closure row merges or Floyd passes.
+    peak_bytes is only recorded while tracemalloc is tracing.
+    """
+    __slots__ = ("name", "seconds", "iterations", "shape", "peak_bytes", "owner", "start")
+
+    def __init__(self, name, owner=None):
+        self.name = name
+        self.seconds = 0.0
+        self.iterations = 0
+        self.shape = None
+        self.peak_bytes = None
+        self.owner = owner
+        self.start = 0.0
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.owner.current = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.start
+        if tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        self.owner.current = None
+        self.owner.finish(self)
+        return False
+
+    def as_dict(self):
+        return {"name": self.name, "seconds": self.seconds, "iterations": self.iterations,
+                "shape": None if self.shape is None else list(self.shape), "peak_bytes": self.peak_bytes}
+
+
+class BuildStats:
+    """
+    Collects PhaseStats of FormMatrix builds, in the order the phases ran.
+
+    :param hook: callable, optional, called with every finished PhaseStats.
+    """
+
+    def __init__(self, hook=None):
+        self.phases = []
+        self.hook = hook
+        self.current = None
+
+    def phase(self, name):
+        """
+        :param name: str, phase name.
+        :return: PhaseStats, to be used as a context manager around the phase.
+        """
+        return PhaseStats(name, self)
+
+    def count(self, steps=1):
+        """
+        Add loop steps to the running phase.
+
+        :param steps: int, number of steps.
+        """
+        if self.current is not None:
+            self.current.iterations += steps
+
+    def finish(self, phase):
+        self.phases.append(phase)
+        if self.hook is not None:
+            self.hook(phase)
+
+    def get(self, name):
+        """
+        :param name: str, phase name.
+        :return: PhaseStats, the last phase with that name, or None.
+        """
+        for phase in reversed(self.phases):
+            if phase.name == name:
+                return phase
+        return None
+
+    def print_stats(self):
+        print("====Build phases====")
+        print("{:17}{:>12}{:>12}{:>12}".format("phase", "seconds", "iterations", "shape"))
+        for phase in self.phases:
+            print("{:17}{:>12.6f}{:>12}{:>12}".format(
+                phase.name, phase.seconds, phase.iterations,
+                "" if phase.shape is None else "x".join(str(n) for n in phase.shape)))
+        print()
+
+
+class NullPhase:
+    """
+    Phase context doing nothing, used when statistics are disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+class NullBuildStats:
+    """
+    Stand-in for BuildStats with every method doing nothing.
+    """
+    phases = ()
+    null_phase = NullPhase()
+
+    def phase(self, name):
+        return self.null_phase
+
+    def count(self, steps=1):
+        pass
+
+
+NULL_BUILD_STATS = NullBuildStats()
+
+
+class ParseStats:
+    """
+    Counters of analyses, accumulated over every analysis run with it.
+
+    shifts counts input symbols pushed into stack, reductions counts reductions,
+    handle_probes counts stack symbols compared while looking for the leftmost phrase and
+    its formula, and max_stack_depth is the deepest stack seen. handle_searches counts searches of
+    the leftmost phrase, one per reduction except the unit reductions SimplePriority applies from
+    its precomputed chains. last holds the first five counters of the latest analysis,
+    as a tuple (shifts, reductions, handle_probes, max_stack_depth, accepted).
+    cache_hits counts analyses answered by the analyzer's ParseCache. They count in parses and
+    accepted, but nothing is shifted or reduced for them, so their other counters are 0.
+
+    :param hook: callable, optional, called with this object after every analysis.
+    """
+    __slots__ = ("parses", "accepted", "shifts", "reductions", "handle_probes", "max_stack_depth",
+                 "handle_searches", "cache_hits", "last", "hook")
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.reset()
+
+    def reset(self):
+        self.parses = 0
+        self.accepted = 0
+        self.shifts = 0
+        self.reductions = 0
+        self.handle_probes = 0
+        self.max_stack_depth = 0
+        self.handle_searches = 0
+        self.cache_hits = 0
+        self.last = None
+
+    def add(self, shifts, reductions, handle_probes, max_stack_depth, accepted, handle_searches=None):
+        """
+        Record counters of one analysis.
+
+        :param handle_searches: int, searches of the leftmost phrase, default to one per reduction.
+        """
+        self.parses += 1
+        if accepted:
+            self.accepted += 1
+        self.shifts += shifts
+        self.reductions += reductions
+        self.handle_probes += handle_probes
+        self.handle_searches += reductions if handle_searches is None else handle_searches
+        if max_stack_depth > self.max_stack_depth:
+            self.max_stack_depth = max_stack_depth
+        self.last = (shifts, reductions, handle_probes, max_stack_depth, accepted)
+        if self.hook is not None:
+            self.hook(self)
+
+    def add_cache_hit(self, accepted):
+        """
+        Record an analysis answered by a ParseCache.
+        """
+        self.cache_hits += 1
+        self.add(0, 0, 0, 0, accepted)
+
+    def as_dict(self):
+        return {"parses": self.parses, "accepted": self.accepted, "shifts": self.shifts,
+                "reductions": self.reductions, "handle_probes": self.handle_probes,
+                "max_stack_depth": self.max_stack_depth, "handle_searches": self.handle_searches,
+                "cache_hits": self.cache_hits}
+
+    def print_stats(self):
+        print("====Analysis counters====")
+        for name, value in self.as_dict().items():
+            print("{:17}{}".format(name, value))
+        print()
+
+
+class Profiler:
+    """
+    Opt-in profile of analyses, attributing counts and time to grammar productions and terminals.
+
+    Time of an analysis is cut at every reduction, the time since the previous reduction is
+    charged to the production reduced. handle_ns is the time spent looking for the leftmost phrase
+    and its formula, relation_ns the time spent comparing priorities to choose between shift and
+    reduce. Both include the cost of the timer calls. Reductions are also aggregated by their path
+    in the parse tree, for writing a collapsed stack file.
+
+    :param productions: list, (non-terminal, formula) tuples indexed by production id.
+    """
+
+    def __init__(self, productions):
+        self.productions = productions
+        self.reset()
+
+    def reset(self):
+        self.parses = 0
+        self.reduction_counts = [0] * len(self.productions)
+        self.reduction_ns = [0] * len(self.productions)
+        # Terminal symbol -> number of shifts.
+        self.shift_counts = dict()
+        self.handle_ns = 0
+        self.relation_ns = 0
+        # Collapsed stack line -> nanoseconds.
+        self.stacks = dict()
+
+    def frame(self, production):
+        """
+        :param production: int, production id.
+        :return: str, name of the production in a collapsed stack, ';' is spelled out as it separates frames.
+        """
+        non_t, formula = self.productions[production]
+        return "{} -> {}".format(non_t, formula).replace(";", "semicolon")
+
+    def add_parse(self, log, reduction_ns, shifts, handle_ns, relation_ns):
+        """
+        Aggregate one analysis.
+
+        :param log: ParseTree.ReductionLog, reductions of the analysis only.
+        :param reduction_ns: list, nanoseconds charged to every reduction of log.
+        :param shifts: dict, terminal symbol -> number of shifts in the analysis.
+        :param handle_ns: int, nanoseconds spent in handle lookup.
+        :param relation_ns: int, nanoseconds spent in relation lookup.
+        """
+        self.parses += 1
+        self.handle_ns += handle_ns
+        self.relation_ns += relation_ns
+        for terminal, count in shifts.items():
+            self.shift_counts[terminal] = self.shift_counts.get(terminal, 0) + count
+        tree = log.to_tree()
+        paths = [None] * len(tree)
+        # A parent is always reduced after its children, walk the log backwards to visit parents first.
+        for node in range(len(tree) - 1, -1, -1):
+            production = tree.production[node]
+            self.reduction_counts[production] += 1
+            self.reduction_ns[production] += reduction_ns[node]
+            parent = tree.parent[node]
+            name = self.frame(production)
+            paths[node] = name if parent == -1 else paths[parent] + ";" + name
+            self.stacks[paths[node]] = self.stacks.get(paths[node], 0) + reduction_ns[node]
+
+    def print_report(self, limit=None):
+        """
+        Print productions sorted by time charged to them, and terminals sorted by shift count.
+
+        :param limit: int, only print that many rows of each table.
+        """
+        total_ns = sum(self.reduction_ns)
+        order = sorted(range(len(self.productions)), key=lambda p: self.reduction_ns[p], reverse=True)
+        print("====Productions by time ({} analyses)====".format(self.parses))
+        print("{:30}{:>12}{:>14}{:>9}".format("production", "reductions", "time us", "time %"))
+        for production in order[:limit]:
+            if self.reduction_counts[production] == 0:
+                continue
+            non_t, formula = self.productions[production]
+            print("{:30}{:>12}{:>14.1f}{:>9.1f}".format(
+                "{} -> {}".format(non_t, formula), self.reduction_counts[production],
+                self.reduction_ns[production] / 1000, 100 * self.reduction_ns[production] / max(total_ns, 1)))
+        print()
+        print("====Terminals by shifts====")
+        print("{:30}{:>12}".format("terminal", "shifts"))
+        for terminal, count in sorted(self.shift_counts.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            print("{:30}{:>12}".format(terminal, count))
+        print()
+        print("handle lookup   {:>12.1f} us".format(self.handle_ns / 1000))
+        print("relation lookup {:>12.1f} us".format(self.relation_ns / 1000))
+        print()
+
+    def write_collapsed(self, file_name):
+        """
+        Write reduction paths as a collapsed stack file, one 'frame;frame;... nanoseconds' line per path,
+        readable by flame graph tools.
+
+        :param file_name: str, file directory.
+        """
+        with open(file_name, "w") as file:
+            for path, ns in sorted(self.stacks.items()):
+                file.write("{} {}\n".format(path, ns))
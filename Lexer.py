@@ -0,0 +1,186 @@
+import re
+
+from utils import load_coding_table
+
+# Descriptions of the codings which are token classes rather than literal tokens.
+IDENTIFIER = "user_defined"
+NUMBER = "unsigned_number"
+NOT_AVAILABLE = "not_available"
+INVALID_IDENTIFIER = "invalid_identifier"
+END = "#"
+# Comment openers are not tokens, a stray "*/" is.
+COMMENT_OPENERS = ("/*", "//")
+
+
+class LexError(ValueError):
+    """
+    Raised when a token has no terminal symbol, carrying its line and column.
+    """
+
+    def __init__(self, line_number, column, message):
+        super().__init__("{}:{}: {}".format(line_number, column, message))
+        self.line_number = line_number
+        self.column = column
+
+
+class Lexer:
+    """
+    Lexical analyzer driven by the coding table.
+
+    Every literal token of the table, keywords and operators, is compiled into one regular
+    expression together with identifiers, unsigned numbers, comments and white space.
+    Operators are tried longest first, so '++', '==', '<>', '>=', '<=' and '**' win over their
+    one character prefixes. Identifiers matching a keyword get the keyword's coding.
+    Comments, '/* ... */' possibly over several lines and '// ...' to the end of line, are skipped.
+    A number directly followed by letters is an invalid identifier, and any other character is
+    not available, both are yielded with their codings so the analysis reports them.
+    """
+
+    def __init__(self, coding_df=None):
+        """
+        :param coding_df: pandas data frame, the coding table, loaded from coding.csv if not given.
+        """
+        if coding_df is None:
+            coding_df = load_coding_table()
+        self.keywords = dict()
+        self.operators = dict()
+        # Description -> coding of token classes, and coding -> terminal symbol.
+        self.classes = dict()
+        self.terminals = dict()
+        for coding, row in coding_df.iterrows():
+            coding = int(coding)
+            desc = str(row["description"])
+            if type(row["secondary"]).__name__ == "str":
+                self.terminals[coding] = row["secondary"]
+            if desc in (IDENTIFIER, NUMBER, NOT_AVAILABLE, INVALID_IDENTIFIER, END):
+                self.classes[desc] = coding
+            elif re.fullmatch(r"[A-Za-z_]\w*", desc):
+                self.keywords[desc] = coding
+            elif desc not in COMMENT_OPENERS:
+                self.operators[desc] = coding
+
+        operators = sorted(self.operators, key=len, reverse=True)
+        self.pattern = re.compile("|".join([
+            r"(?P<space>\s+)",
+            r"(?P<block_comment>/\*(?:.*?(?P<closed>\*/)|.*))",
+            r"(?P<line_comment>//.*)",
+            r"(?P<invalid>\d+[A-Za-z_]\w*)",
+            r"(?P<number>\d+)",
+            r"(?P<word>[A-Za-z_]\w*)",
+            "(?P<operator>{})".format("|".join(re.escape(operator) for operator in operators)),
+            r"(?P<other>.)",
+        ]))
+
+    def scan_lines(self, lines):
+        """
+        Scan source lines lazily.
+
+        :param lines: iterable, source lines, like an open file.
+        :return: generator, yielding (coding, token, line number, column) tuples, positions are 1-based.
+        """
+        keywords = self.keywords
+        operators = self.operators
+        classes = self.classes
+        in_comment = False
+        for line_number, line in enumerate(lines, 1):
+            position = 0
+            if in_comment:
+                position = line.find("*/")
+                if position < 0:
+                    continue
+                position += 2
+                in_comment = False
+            for match in self.pattern.finditer(line, position):
+                kind = match.lastgroup
+                if kind == "space" or kind == "line_comment":
+                    continue
+                if kind == "block_comment":
+                    in_comment = match.group("closed") is None
+                    continue
+                token = match.group()
+                if kind == "word":
+                    coding = keywords.get(token, classes[IDENTIFIER])
+                elif kind == "operator":
+                    coding = operators[token]
+                elif kind == "number":
+                    coding = classes[NUMBER]
+                elif kind == "invalid":
+                    coding = classes[INVALID_IDENTIFIER]
+                else:
+                    coding = classes[NOT_AVAILABLE]
+                yield coding, token, line_number, match.start() + 1
+
+    def scan(self, text):
+        """
+        :param text: str, source text.
+        :return: generator, see scan_lines.
+        """
+        return self.scan_lines(text.splitlines(keepends=True))
+
+    def codings(self, text):
+        """
+        :param text: str, source text.
+        :return: generator, yielding the coding of every token.
+        """
+        for coding, token, line_number, column in self.scan(text):
+            yield coding
+
+    def terminal_series(self, lines):
+        """
+        Scan source lines straight into the terminal symbols the analyzers read.
+
+        :param lines: iterable, source lines, like an open file.
+        :return: generator, yielding terminal symbols.
+        :raise LexError: When a token's coding has no terminal symbol.
+        """
+        terminals = self.terminals
+        for coding, token, line_number, column in self.scan_lines(lines):
+            terminal = terminals.get(coding)
+            if terminal is None:
+                raise LexError(line_number, column, "'{}' (coding {}) is not a terminal symbol.".format(token, coding))
+            yield terminal
+
+    def terminal_ids(self, lines, symbol_ids):
+        """
+        Scan source lines straight into the terminal ids an analyzer interned its symbols into.
+
+        The ids of all codings are looked up once, so every token costs a single dict lookup.
+
+        :param lines: iterable, source lines, like an open file.
+        :param symbol_ids: dict, terminal symbol -> id, like OperatorPriorityAn.symbol_ids.
+        :return: generator, yielding terminal ids.
+        :raise LexError: When a token's coding has no terminal symbol, or its terminal symbol has no id.
+        """
+        coding_ids = {coding: symbol_ids[terminal] for coding, terminal in self.terminals.items()
+                      if terminal in symbol_ids}
+        for coding, token, line_number, column in self.scan_lines(lines):
+            symbol_id = coding_ids.get(coding)
+            if symbol_id is None:
+                terminal = self.terminals.get(coding)
+                if terminal is None:
+                    message = "'{}' (coding {}) is not a terminal symbol.".format(token, coding)
+                else:
+                    message = "'{}' (terminal {}) is not a symbol of grammar.".format(token, terminal)
+                raise LexError(line_number, column, message)
+            yield symbol_id
+
+    def write_coding(self, lines, file_name):
+        """
+        Write the tokens of source lines in the lexical analysis output format read by utils.load_coding,
+        one line of '(coding, token)' pairs per source line.
+
+        :param lines: iterable, source lines.
+        :param file_name: str, output file directory.
+        """
+        identifier = self.classes[IDENTIFIER]
+        number = self.classes[NUMBER]
+        with open(file_name, "w") as file:
+            current_line = None
+            for coding, token, line_number, column in self.scan_lines(lines):
+                if not line_number == current_line:
+                    if current_line is not None:
+                        file.write("\n")
+                    current_line = line_number
+                # Only identifiers and numbers carry their token, others could hold ')' or ','.
+                file.write("({}, {})".format(coding, token if coding in (identifier, number) else "-"))
+            file.write("\n")
@@ -0,0 +1,331 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join("..", ""))
+
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from ParseTree import ReductionLog
+from utils import load_grammar
+
+# Error codes of BatchResult, in the order control checks for them.
+NO_ERROR = 0
+NOT_TERMINAL = 1
+REDUCED_TO_NOTHING = 2
+NO_LEFTMOST_PHRASE = 3
+NO_MATCHING_FORMULA = 4
+# '#' itself shifted, control reads past the end of its input.
+INPUT_EXHAUSTED = 5
+
+
+class BatchResult:
+    """
+    Outcome of a batch analysis, indexed like the batch.
+
+    :param accepted: numpy array, whether every series is accepted.
+    :param scan_index: numpy array, the scan index control would stop at for every series.
+    :param error_codes: numpy array, NO_ERROR or the error every series is rejected with.
+    :param messages: dict, index -> message of errors carrying their own.
+    :param logs: list, ReductionLog of every series, or None if not kept.
+    """
+
+    def __init__(self, accepted, scan_index, error_codes, messages, logs=None):
+        self.accepted = accepted
+        self.scan_index = scan_index
+        self.error_codes = error_codes
+        self.messages = messages
+        self.logs = logs
+
+    def __len__(self):
+        return len(self.accepted)
+
+    def error(self, index):
+        """
+        :param index: int, index of a series in the batch.
+        :return: Exception, the error control raises on the series, or None if it is accepted.
+        """
+        code = self.error_codes[index]
+        if code == NO_ERROR:
+            return None
+        if code == NOT_TERMINAL:
+            return ValueError(self.messages[index])
+        if code == REDUCED_TO_NOTHING:
+            return ValueError("Input series reduced to nothing.")
+        if code == NO_LEFTMOST_PHRASE:
+            return ValueError("No leftmost phrase in stack.")
+        if code == INPUT_EXHAUSTED:
+            return IndexError("list index out of range")
+        return KeyError(self.messages[index])
+
+
+class BatchAn:
+    """
+    Operator priority analysis of many input series in lockstep.
+
+    A batch is held as a padded array of symbol ids, every row ending with '#', and every row
+    has its own stacks stored in flat arrays, row r owning one fixed range of slots in each:
+    span starts and prefix keys of the stack items, symbol ids and stack indexes of the terminals
+    in stack, and the terminals higher than the terminal below them. Every step advances all
+    unfinished rows by one shift or one reduction, like one round of the loop in
+    OperatorPriorityAn.control: the f and g values of the topmost terminal and the current
+    symbol are gathered for all rows at once. The leftmost phrase starts right after the terminal
+    below the last higher one, and its key is cut out of the prefix keys of the stack, the symbols
+    up to an item read as digits, then looked up with searchsorted in the sorted keys of all
+    formulas. Non-terminals are all one digit, as operator priority analysis does not tell them
+    apart. Accepted and rejected rows drop out of the next step.
+
+    Results are the same as control's: acceptance, scan index, error and reductions.
+    """
+
+    def __init__(self, grammar, form_matrix=None, batch_size=4096):
+        """
+        :param grammar: pandas data frame, containing grammar details. Ignored if form_matrix is given.
+        :param form_matrix: FormMatrix, LevelMatrix or SharedTables.CompiledTables, already compiled tables.
+        :param batch_size: int, most series analyzed in lockstep, larger batches are split.
+        :raise ValueError: When formulas are too long for the handle keys to fit in 64 bits.
+        """
+        self.analyzer = OperatorPriorityAn(grammar, form_matrix)
+        self.batch_size = batch_size
+        analyzer = self.analyzer
+        self.symbol_ids = analyzer.symbol_ids
+        self.symbol_names = analyzer.symbol_names
+        self.non_t_base = analyzer.non_t_base
+        self.terminal_ids = {symbol: i for symbol, i in self.symbol_ids.items() if i < self.non_t_base}
+        self.end_id = analyzer.end_id
+        # Indexed by symbol id, non-terminals included, so gathers need no bounds check.
+        self.f_values = np.zeros(len(self.symbol_names), np.int64)
+        self.g_values = np.zeros(len(self.symbol_names), np.int64)
+        self.f_values[:self.non_t_base] = analyzer.f_values
+        self.g_values[:self.non_t_base] = analyzer.g_values
+        self.build_handle_keys()
+
+    def build_handle_keys(self):
+        """
+        Turn every formula shape of the handle trie into the key of its symbol ids, read as digits
+        id + 1 in base key_base, most significant first, with non-terminals collapsed into non_t_base.
+        Digits are never 0, so shapes of different lengths have different keys.
+        """
+        self.key_base = self.non_t_base + 2
+        shapes = []
+        nodes = [(self.analyzer.handle_trie, [])]
+        while len(nodes) > 0:
+            node, shape = nodes.pop()
+            for key, child in node.items():
+                if key == -1:
+                    shapes.append((shape, child))
+                else:
+                    nodes.append((child, shape + [key]))
+        self.max_length = max(len(shape) for shape, production in shapes)
+        if self.key_base ** self.max_length >= 2 ** 63:
+            raise ValueError("Formulas of {} symbols are too long for batch analysis.".format(self.max_length))
+        # key_base ** length for phrases as long as a formula, 0 for longer ones, which match none.
+        self.key_powers = np.zeros(self.max_length + 2, np.int64)
+        self.key_powers[:self.max_length + 1] = [self.key_base ** length for length in range(self.max_length + 1)]
+        keys = []
+        for shape, production in shapes:
+            key = 0
+            for symbol in shape:
+                key = key * self.key_base + symbol + 1
+            keys.append(key)
+        keys = np.array(keys, np.int64)
+        order = np.argsort(keys, kind="stable")
+        self.handle_keys = keys[order]
+        self.handle_productions = np.array([shapes[i][1] for i in order], np.int32)
+
+    def analyze(self, batch, logs=False):
+        """
+        :param batch: list, input identifier series, without the ending '#'.
+        :param logs: bool, whether to collect the reductions of every series.
+        :return: BatchResult.
+        """
+        count = len(batch)
+        accepted = np.zeros(count, bool)
+        scan_index = np.zeros(count, np.int64)
+        error_codes = np.zeros(count, np.int8)
+        messages = dict()
+        result_logs = [ReductionLog() for index in range(count)] if logs else None
+
+        # Series of about the same length share a chunk, keeping padding and steps low.
+        order = sorted(range(count), key=lambda index: len(batch[index]))
+        for first in range(0, count, self.batch_size):
+            rows = order[first:first + self.batch_size]
+            self.analyze_chunk([batch[index] for index in rows], np.array(rows, np.int64), accepted, scan_index,
+                               error_codes, messages, result_logs)
+        return BatchResult(accepted, scan_index, error_codes, messages, result_logs)
+
+    def analyze_chunk(self, batch, targets, accepted, scan_index, error_codes, messages, logs):
+        """
+        Analyze series in lockstep, writing the outcome of series i at targets[i] of the result arrays.
+        """
+        non_t_base = self.non_t_base
+        end_id = self.end_id
+        f_values = self.f_values
+        g_values = self.g_values
+        key_base = self.key_base
+        key_powers = self.key_powers
+        max_length = self.max_length
+        handle_keys = self.handle_keys
+
+        count = len(batch)
+        lengths = np.array([len(series) for series in batch], np.int64)
+        width = int(lengths.max()) + 1
+        terminal_ids = self.terminal_ids
+        flat = np.array([terminal_ids.get(symbol, -1) for series in batch for symbol in series], np.int32)
+        ids = np.full((count, width), end_id, np.int32)
+        ids[np.arange(width) < lengths[:, None]] = flat
+        ids = ids.reshape(-1)
+        live = np.ones(count, bool)
+        unknown = np.nonzero(flat < 0)[0]
+        if len(unknown) > 0:
+            owners, first = np.unique(np.repeat(np.arange(count), lengths)[unknown], return_index=True)
+            positions = unknown[first] - (np.cumsum(lengths) - lengths)[owners]
+            for row, position in zip(owners.tolist(), positions.tolist()):
+                error_codes[targets[row]] = NOT_TERMINAL
+                scan_index[targets[row]] = position
+                messages[int(targets[row])] = "'{}' is not a terminal symbol of grammar.".format(batch[row][position])
+            live[owners] = False
+
+        # Row r owns slots r * depth ... (r + 1) * depth - 1 of every flat per-row stack below.
+        depth = width + 1
+        bases = np.arange(count, dtype=np.int64) * depth
+        # Per stack item: first input token it covers, and the key of all symbols up to it, see build_handle_keys.
+        span_starts = np.empty(count * depth, np.int64)
+        prefixes = np.empty(count * depth, np.int64)
+        # Per terminal in stack: its symbol id and stack index.
+        terminals = np.empty(count * depth, np.int32)
+        t_positions = np.empty(count * depth, np.int64)
+        # Indexes of the terminals higher than the terminal below them, the last one is where the leftmost phrase
+        # starts its terminals.
+        rises = np.empty(count * depth, np.int64)
+        span_starts[bases] = -1
+        prefixes[bases] = end_id + 1
+        terminals[bases] = end_id
+        t_positions[bases] = 0
+        sizes = np.ones(count, np.int64)
+        t_counts = np.ones(count, np.int64)
+        rise_counts = np.zeros(count, np.int64)
+        tops = np.full(count, end_id, np.int32)
+        cursors = np.zeros(count, np.int64)
+        row_starts = np.arange(count, dtype=np.int64) * width
+        reductions = []
+
+        active = np.nonzero(live)[0]
+        while len(active) > 0:
+            cursor = cursors[active]
+            current = ids[row_starts[active] + cursor]
+            top = tops[active]
+            f_top = f_values[top]
+            g_current = g_values[current]
+            shift = f_top <= g_current
+            at_end = shift & (top == end_id) & (current == end_id)
+            finished = at_end
+            if at_end.any():
+                done = active[at_end]
+                accepted[targets[done]] = sizes[done] == 2
+                error_codes[targets[done]] = np.where(sizes[done] == 2, NO_ERROR, REDUCED_TO_NOTHING)
+                scan_index[targets[done]] = cursor[at_end] + 1
+                shift &= ~at_end
+            reduce = ~(shift | at_end)
+
+            picks = np.nonzero(shift)[0]
+            if len(picks) > 0:
+                rows = active[picks]
+                base = bases[rows]
+                size = sizes[rows]
+                t_count = t_counts[rows]
+                symbol = current[picks]
+                position = cursor[picks]
+                slot = base + size
+                span_starts[slot] = position
+                prefixes[slot] = prefixes[slot - 1] * key_base + symbol + 1
+                terminals[base + t_count] = symbol
+                t_positions[base + t_count] = size
+                rising = f_top[picks] < g_current[picks]
+                rising_rows = rows[rising]
+                rises[bases[rising_rows] + rise_counts[rising_rows]] = t_count[rising]
+                rise_counts[rising_rows] += 1
+                sizes[rows] = size + 1
+                t_counts[rows] = t_count + 1
+                tops[rows] = symbol
+                cursors[rows] = position + 1
+                exhausted = position >= lengths[rows]
+                if exhausted.any():
+                    lost = rows[exhausted]
+                    error_codes[targets[lost]] = INPUT_EXHAUSTED
+                    scan_index[targets[lost]] = position[exhausted] + 1
+                    finished = finished.copy()
+                    finished[picks[exhausted]] = True
+
+            picks = np.nonzero(reduce)[0]
+            if len(picks) > 0:
+                rows = active[picks]
+                base = bases[rows]
+                rise_count = rise_counts[rows]
+                failed = rise_count == 0
+                if failed.any():
+                    lost = rows[failed]
+                    error_codes[targets[lost]] = NO_LEFTMOST_PHRASE
+                    scan_index[targets[lost]] = cursor[picks[failed]] + 1
+                    finished = finished.copy()
+                    finished[picks[failed]] = True
+                    picks = picks[~failed]
+                    rows = rows[~failed]
+                    base = base[~failed]
+                    rise_count = rise_count[~failed]
+
+                right = rises[base + rise_count - 1]
+                start = t_positions[base + right - 1] + 1
+                size = sizes[rows]
+                length = size - start
+                keys = prefixes[base + size - 1] - prefixes[base + start - 1] * key_powers[np.minimum(length, max_length + 1)]
+                slots = np.minimum(np.searchsorted(handle_keys, keys), len(handle_keys) - 1)
+                matched = (handle_keys[slots] == keys) & (length <= max_length)
+
+                if not matched.all():
+                    unmatched = ~matched
+                    for row, right_index in zip(rows[unmatched].tolist(), right[unmatched].tolist()):
+                        names = terminals[bases[row] + right_index:bases[row] + t_counts[row]]
+                        messages[int(targets[row])] = "No matching formula for operator {}".format(
+                            " ".join(self.symbol_names[symbol] for symbol in names))
+                    lost = rows[unmatched]
+                    error_codes[targets[lost]] = NO_MATCHING_FORMULA
+                    scan_index[targets[lost]] = cursor[picks[unmatched]] + 1
+                    finished = finished.copy()
+                    finished[picks[unmatched]] = True
+                    rows = rows[matched]
+                    picks = picks[matched]
+                    base = base[matched]
+                    right = right[matched]
+                    start = start[matched]
+                    slots = slots[matched]
+
+                productions = self.handle_productions[slots]
+                if logs is not None:
+                    reductions.append(np.stack((rows, productions, span_starts[base + start], cursor[picks]), axis=1))
+                slot = base + start
+                prefixes[slot] = prefixes[slot - 1] * key_base + non_t_base + 1
+                sizes[rows] = start + 1
+                t_counts[rows] = right
+                rise_counts[rows] -= 1
+                tops[rows] = terminals[base + right - 1]
+
+            if finished.any():
+                active = active[~finished]
+
+        if logs is not None and len(reductions) > 0:
+            reductions = np.concatenate(reductions)
+            # Reductions of a row stay in step order after the stable sort.
+            reductions = reductions[np.argsort(reductions[:, 0], kind="stable")]
+            bounds = np.searchsorted(reductions[:, 0], np.arange(count + 1))
+            entries = reductions[:, 1:].astype(np.int32)
+            for row in range(count):
+                if bounds[row] < bounds[row + 1]:
+                    logs[targets[row]].data.frombytes(entries[bounds[row]:bounds[row + 1]].tobytes())
+
+
+if __name__ == "__main__":
+    batch_an = BatchAn(load_grammar(os.path.join("data", "grammar.txt")))
+    result = batch_an.analyze([series.split(" ") for series in ["i * i", "i + ( i * i", "i + E", "i i"]])
+    for index in range(len(result)):
+        print(bool(result.accepted[index]), int(result.scan_index[index]), repr(result.error(index)))
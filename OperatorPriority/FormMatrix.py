@@ -2,33 +2,77 @@ import pandas as pd
 import numpy as np
 import time
 
+from DerivedTables import DerivedTable, build_order
+from Grammar import as_grammar
+from Instrumentation import NULL_BUILD_STATS
+
 
 class FormMatrix:
-    def __init__(self, grammar):
-        self.grammar = grammar
-        self.non_ts = list(sorted(grammar[~grammar.index.duplicated(keep='first')].index))
+    """
+    Operator priority tables of a grammar.
+
+    Terminal symbols are gathered on construction. The other tables are DerivedTable
+    attributes, built on first access together with the tables they depend on:
+    equal_matrix, first_matrix and last_matrix from the grammar, priority_matrix from those three,
+    and floyd_matrix from priority_matrix. Assign a table before reading it to skip building it
+    and everything only it depends on, e.g. floyd_matrix loaded from a cache. Call build to build
+    tables up front.
+    """
+
+    def __init__(self, grammar, stats=None):
+        """
+        :param grammar: Grammar or pandas data frame, containing grammar details.
+        :param stats: Instrumentation.BuildStats, optional, records time, iterations and size of every phase.
+        """
+        self.grammar = as_grammar(grammar)
+        self.non_ts = list(sorted(self.grammar.non_ts))
         self.floyd_index = ["f", "g"]
+        self.productions = self.grammar.productions
+        self.stats = NULL_BUILD_STATS if stats is None else stats
 
-        self.ts = self.gather_all_terminal()
-        self.ts.append("#")
-        self.ts_count = len(self.ts)
-        self.non_ts_count = len(self.non_ts)
+        with self.stats.phase("terminals") as phase:
+            self.ts = self.gather_all_terminal()
+            self.ts.append("#")
+            self.ts_count = len(self.ts)
+            self.non_ts_count = len(self.non_ts)
+            phase.shape = (self.ts_count,)
 
         # self.print_grammar()
 
-        equal_matrix = self.cal_equal()
-        # self.print_matrix(equal_matrix, "equal")
+    @DerivedTable("equal")
+    def equal_matrix(self):
+        return self.cal_equal()
 
-        self.first_matrix = self.cal_matrix("firstvt")
+    @DerivedTable("firstvt")
+    def first_matrix(self):
         # self.print_matrix(first_matrix, "firstvt", columns=self.ts, index=self.non_ts)
-        self.last_matrix = self.cal_matrix("lastvt")
+        return self.cal_matrix("firstvt")
+
+    @DerivedTable("lastvt")
+    def last_matrix(self):
         # self.print_matrix(last_matrix, "lastvt", columns=self.ts, index=self.non_ts)
+        return self.cal_matrix("lastvt")
 
-        self.priority_matrix = self.construct_priority_matrix(self.first_matrix, self.last_matrix, equal_matrix)
+    @DerivedTable("priority_matrix", ("first_matrix", "last_matrix", "equal_matrix"))
+    def priority_matrix(self):
         # self.print_priority(self.priority_matrix, "relationship")
+        return self.construct_priority_matrix(self.first_matrix, self.last_matrix, self.equal_matrix)
 
-        self.floyd_matrix = self.cal_floyd()
+    @DerivedTable("floyd", ("priority_matrix",))
+    def floyd_matrix(self):
         # self.print_matrix(self.floyd_matrix, "floyd", columns=self.ts, index=self.floyd_index)
+        return self.cal_floyd()
+
+    def build(self, *names):
+        """
+        Build derived tables now, in the order of their dependencies.
+
+        :param names: str, names of the tables to build, default to all.
+        :return: FormMatrix, self.
+        """
+        for name in build_order(type(self), names or None):
+            getattr(self, name)
+        return self
 
     def print_grammar(self):
         """
@@ -45,16 +89,9 @@ class FormMatrix:
         Returns all formulas corresponding to the specified non-terminal symbol.
 
         :param non_t: string, the non-terminal symbol.
-        :return: list or pandas Series, all formulas corresponding to the specified non-terminal symbol
+        :return: list, all formulas corresponding to the specified non-terminal symbol
         """
-        formulas = self.grammar.loc[non_t]
-        formulas = formulas["formula"]
-        if type(formulas).__name__ == "str":
-            # If there is only one formula corresponding to the non-terminal symbol,
-            # the returned 'formulas' could be string object.
-            # Considering we have to traverse 'formulas', we turn it to a list here.
-            formulas = [formulas]
-        return formulas
+        return self.grammar.get_all_formulas(non_t)
 
     def gather_all_terminal(self):
         """
@@ -147,6 +184,7 @@ class FormMatrix:
             # print(stack)
             top = stack[-1]
             del stack[-1]
+            self.stats.count()
             for non_t in self.get_non_t(top[0], matrix=matrix):
                 if result[self.non_ts.index(non_t), self.ts.index(top[1])] == 0:
                     result[self.non_ts.index(non_t), self.ts.index(top[1])] = 1
@@ -213,8 +251,9 @@ class FormMatrix:
         :return: numpy array, containing Floyd result matrix.
         """
         result = np.ones((2, self.ts_count), int)
-        start = time.time()
+        start = time.perf_counter()
         while True:
+            self.stats.count()
             changed = False
             for t1 in self.ts:
                 for t2 in self.ts:
@@ -237,7 +276,7 @@ class FormMatrix:
                         changed = True
             if not changed:
                 break
-            if time.time() - start > 2:
+            if time.perf_counter() - start > 2:
                 raise ValueError("Some error in grammar causing floyd calculation timeout.")
         return result
 
@@ -0,0 +1,356 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join("..", ""))
+
+from Grammar import Grammar, GrammarError, as_grammar
+from Instrumentation import NULL_BUILD_STATS
+
+ASSOCIATIVITIES = ("left", "right", "nonassoc")
+
+# Terminal kinds.
+OPERATOR, ATOM, OPEN, CLOSE, END = range(5)
+# (left kind, right kind) -> whether the two terminals have a priority relation.
+# Open and close brackets only relate in their own pairs, which is set apart.
+RELATED = np.array([
+    # operator, atom, open, close, end
+    [1, 1, 1, 1, 1],  # operator
+    [1, 0, 0, 1, 1],  # atom
+    [1, 1, 1, 0, 0],  # open
+    [1, 0, 0, 1, 1],  # close
+    [1, 1, 1, 0, 1],  # end
+], dtype=bool)
+
+
+class LevelMatrix:
+    """
+    Operator priority tables built straight from declared precedence levels,
+    with the same interface as OperatorPriority FormMatrix.
+
+    levels are ordered from the lowest precedence to the highest, like yacc declarations.
+    Every level binds its operators as binary ones with the level's associativity, and the
+    grammar they stand for is the usual ladder of non-terminals:
+    E0 -> E0 + E1 | E1 (left), E0 -> E1 ^ E0 | E1 (right), E0 -> E1 < E1 | E1 (nonassoc),
+    down to the atoms and brackets, E2 -> ( E0 ) | i.
+
+    The relation of two terminals only depends on their kinds, levels and associativity,
+    so the priority matrix and f/g functions are written down directly, without FIRSTVT,
+    LASTVT or Floyd iterations.
+    """
+
+    def __init__(self, levels, atoms, brackets, grammar=None, stats=None):
+        """
+        :param levels: list, (associativity, list of operators) tuples, from the lowest precedence.
+            associativity is one of 'left', 'right' and 'nonassoc'.
+        :param atoms: list, terminal symbols standing for operands, like 'i'.
+        :param brackets: list, (open, close) terminal symbol tuples.
+        :param grammar: Grammar, the ladder grammar the levels stand for, synthesized if not given.
+        :param stats: Instrumentation.BuildStats, optional, records time and size of every phase.
+        """
+        self.levels = [(associativity, list(operators)) for associativity, operators in levels]
+        self.atoms = list(atoms)
+        self.brackets = [tuple(pair) for pair in brackets]
+        self.floyd_index = ["f", "g"]
+        self.stats = NULL_BUILD_STATS if stats is None else stats
+
+        with self.stats.phase("levels") as phase:
+            self.check_levels()
+            self.grammar = self.synthesize_grammar() if grammar is None else as_grammar(grammar)
+            self.non_ts = list(sorted(self.grammar.non_ts))
+            self.productions = self.grammar.productions
+            self.ts = list(sorted(self.kinds)) + ["#"]
+            self.ts_count = len(self.ts)
+            self.non_ts_count = len(self.non_ts)
+            phase.shape = (len(self.levels), self.ts_count)
+
+        with self.stats.phase("floyd") as phase:
+            self.floyd_matrix = self.cal_floyd()
+            phase.shape = self.floyd_matrix.shape
+
+        with self.stats.phase("priority_matrix") as phase:
+            self.priority_matrix = self.construct_priority_matrix()
+            phase.shape = self.priority_matrix.shape
+
+    @classmethod
+    def from_lines(cls, lines, source="<text>", stats=None):
+        """
+        Build from lines of declarations, one level per line from the lowest precedence:
+
+            %left + -
+            %left * /
+            %right ^
+            %atom i
+            %bracket ( )
+
+        :param lines: iterable, containing declaration lines. Empty lines are ignored.
+        :param source: str, name of the declaration source, used in error messages.
+        :param stats: Instrumentation.BuildStats, optional.
+        :return: LevelMatrix.
+        :raise GrammarError: When a line is not a valid declaration.
+        """
+        levels = []
+        atoms = []
+        brackets = []
+        for line_number, line in enumerate(lines, 1):
+            chars = line.split()
+            if len(chars) == 0:
+                continue
+            directive = chars[0]
+            if directive[1:] in ASSOCIATIVITIES and directive.startswith("%"):
+                levels.append((directive[1:], chars[1:]))
+            elif directive == "%atom":
+                atoms.extend(chars[1:])
+            elif directive == "%bracket":
+                if not len(chars) == 3:
+                    raise GrammarError("%bracket takes one open and one close symbol", source, line_number)
+                brackets.append((chars[1], chars[2]))
+            else:
+                raise GrammarError("unknown declaration {!r}".format(directive), source, line_number)
+        try:
+            return cls(levels, atoms, brackets, stats=stats)
+        except ValueError as e:
+            raise GrammarError(str(e), source) from e
+
+    @classmethod
+    def from_file(cls, file_name, stats=None):
+        """
+        :param file_name: str, declaration file directory.
+        :param stats: Instrumentation.BuildStats, optional.
+        :return: LevelMatrix.
+        """
+        with open(file_name, "r") as file:
+            return cls.from_lines(file, source=file_name, stats=stats)
+
+    @classmethod
+    def from_grammar(cls, grammar, stats=None):
+        """
+        Recognize the levels of a ladder shaped operator grammar, like
+        E -> E + T | E - T | T, T -> T * F | T / F | F, F -> ( E ) | i,
+        and build from them, keeping the grammar's own symbols.
+
+        :param grammar: Grammar or pandas data frame.
+        :param stats: Instrumentation.BuildStats, optional.
+        :return: LevelMatrix.
+        :raise GrammarError: When grammar is not a ladder of binary operator levels.
+        """
+        grammar = as_grammar(grammar)
+        start_symbol = grammar.non_ts[0]
+        levels = []
+        visited = set()
+        non_t = start_symbol
+        while True:
+            visited.add(non_t)
+            chars_list = [formula.split(" ") for formula in grammar.get_all_formulas(non_t)]
+            units = [chars[0] for chars in chars_list if len(chars) == 1 and chars[0] in grammar.formulas]
+            if len(units) == 0:
+                break
+            lower = units[0]
+            if len(units) > 1 or lower in visited:
+                raise GrammarError("{} is not one precedence level".format(non_t))
+            associativity = None
+            operators = []
+            for chars in chars_list:
+                if chars == [lower]:
+                    continue
+                shape = None
+                if len(chars) == 3 and chars[1] not in grammar.formulas:
+                    shape = {(non_t, lower): "left", (lower, non_t): "right",
+                             (lower, lower): "nonassoc"}.get((chars[0], chars[2]))
+                if shape is None or (associativity is not None and not shape == associativity):
+                    raise GrammarError("formula '{} -> {}' does not fit a precedence level".format(
+                        non_t, " ".join(chars)))
+                associativity = shape
+                operators.append(chars[1])
+            levels.append((associativity or "left", operators))
+            non_t = lower
+
+        atoms = []
+        brackets = []
+        for formula in grammar.get_all_formulas(non_t):
+            chars = formula.split(" ")
+            if len(chars) == 1 and chars[0] not in grammar.formulas:
+                atoms.append(chars[0])
+            elif len(chars) == 3 and chars[1] == start_symbol and \
+                    chars[0] not in grammar.formulas and chars[2] not in grammar.formulas:
+                brackets.append((chars[0], chars[2]))
+            else:
+                raise GrammarError("formula '{} -> {}' is neither an atom nor a bracket".format(non_t, formula))
+        try:
+            return cls(levels, atoms, brackets, grammar=grammar, stats=stats)
+        except ValueError as e:
+            raise GrammarError(str(e)) from e
+
+    def check_levels(self):
+        """
+        Assign every terminal its kind and level, checking that no terminal is declared twice.
+
+        :raise ValueError: When declarations are not valid.
+        """
+        # Terminal symbol -> kind, and operator -> (level, associativity).
+        self.kinds = dict()
+        self.operator_levels = dict()
+
+        def declare(symbol, kind):
+            if symbol == "#" or symbol.isupper():
+                raise ValueError("'{}' can not be a terminal symbol.".format(symbol))
+            if symbol in self.kinds:
+                raise ValueError("'{}' is declared more than once.".format(symbol))
+            self.kinds[symbol] = kind
+
+        for level, (associativity, operators) in enumerate(self.levels):
+            if associativity not in ASSOCIATIVITIES:
+                raise ValueError("Unknown associativity '{}'.".format(associativity))
+            for operator in operators:
+                declare(operator, OPERATOR)
+                self.operator_levels[operator] = (level, associativity)
+        for atom in self.atoms:
+            declare(atom, ATOM)
+        for open_symbol, close_symbol in self.brackets:
+            declare(open_symbol, OPEN)
+            declare(close_symbol, CLOSE)
+        if len(self.atoms) == 0:
+            raise ValueError("At least one atom is needed.")
+
+    def synthesize_grammar(self):
+        """
+        :return: Grammar, the ladder grammar of the levels, with non-terminals E0, E1, ...
+        """
+        grammar = Grammar()
+        for level, (associativity, operators) in enumerate(self.levels):
+            non_t = "E{}".format(level)
+            lower = "E{}".format(level + 1)
+            left, right = {"left": (non_t, lower), "right": (lower, non_t),
+                           "nonassoc": (lower, lower)}[associativity]
+            for operator in operators:
+                grammar.add_production(non_t, [left, operator, right])
+            grammar.add_production(non_t, [lower])
+        atom_non_t = "E{}".format(len(self.levels))
+        for open_symbol, close_symbol in self.brackets:
+            grammar.add_production(atom_non_t, [open_symbol, "E0", close_symbol])
+        for atom in self.atoms:
+            grammar.add_production(atom_non_t, [atom])
+        return grammar
+
+    def get_all_formulas(self, non_t):
+        """
+        Returns all formulas corresponding to the specified non-terminal symbol.
+
+        :param non_t: string, the non-terminal symbol.
+        :return: list, all formulas corresponding to the specified non-terminal symbol
+        """
+        return self.grammar.get_all_formulas(non_t)
+
+    def cal_floyd(self):
+        """
+        Write down precedence functions.
+
+        With level l counted from 0 and base = 2l + 2, operators get f = base + 1, g = base when
+        left associative, f = base, g = base + 1 when right associative, and f = g = base when not
+        associative. Atoms and close brackets have f above every operator, open brackets and atoms
+        have g above every operator, and '#' is below everything.
+
+        :return: numpy array, f and g values of every terminal in ts order.
+        """
+        top = 2 * len(self.levels) + 2
+        result = np.zeros((2, self.ts_count), int)
+        for index, symbol in enumerate(self.ts[:-1]):
+            kind = self.kinds[symbol]
+            if kind == OPERATOR:
+                level, associativity = self.operator_levels[symbol]
+                base = 2 * level + 2
+                result[:, index] = {"left": (base + 1, base), "right": (base, base + 1),
+                                    "nonassoc": (base, base)}[associativity]
+            else:
+                result[:, index] = {ATOM: (top, top), OPEN: (1, top), CLOSE: (top, 1)}[kind]
+        return result
+
+    def construct_priority_matrix(self):
+        """
+        Read relations off the precedence functions, keeping only pairs of terminals which may
+        meet in a sentence: operators of one non-associative level, unmatched brackets and
+        some atom and bracket pairs have no relation.
+
+        :return: numpy array, containing operator priority matrix.
+        """
+        kinds = np.array([self.kinds[symbol] for symbol in self.ts[:-1]] + [END])
+        levels = np.array([self.operator_levels.get(symbol, (-1, None))[0] for symbol in self.ts[:-1]] + [-1])
+        nonassoc = np.array([self.operator_levels.get(symbol, (-1, None))[1] == "nonassoc"
+                             for symbol in self.ts[:-1]] + [False])
+
+        related = RELATED[kinds[:, None], kinds[None, :]]
+        related &= ~(nonassoc[:, None] & nonassoc[None, :] & (levels[:, None] == levels[None, :]))
+        for open_symbol, close_symbol in self.brackets:
+            related[self.ts.index(open_symbol), self.ts.index(close_symbol)] = True
+
+        f = self.floyd_matrix[0]
+        g = self.floyd_matrix[1]
+        result = np.sign(f[:, None] - g[None, :])
+        result[result == 0] = 2
+        result[~related] = 0
+        result[-1, -1] = 3
+        return result
+
+    def get_relation(self, s1, s2):
+        """
+        Get the relation between symbol s1 and symbol s2.
+
+        :param s1: The first symbol to be compared.
+        :param s2: The second symbol to be compared.
+        :return: int, the relationship between s1 and s2.
+            0 means s1 = s2, -1 means s1 < s2, 1 means s1 > s2.
+        :raise ValueError: When there is no relationship between s1 and s2.
+        """
+        result = self.priority_matrix[self.ts.index(s1), self.ts.index(s2)]
+        if result == 2:
+            result = 0
+        elif result == 0:
+            raise ValueError("No relationship between {} and {}.".format(s1, s2))
+        return result
+
+
+def cross_check(level_matrix):
+    """
+    Compare a LevelMatrix with the classic construction of OperatorPriority FormMatrix on its grammar.
+
+    The classic construction relates '#' only to terminals next to a non-terminal inside some
+    formula, so without a bracket level it misses '#' < FIRSTVT and LASTVT > '#' of the start
+    symbol, which follow from the sentence '# E0 #'. Those relations are added to the classic
+    matrix before comparing.
+
+    :param level_matrix: LevelMatrix.
+    :return: list, one message per difference, empty if both agree. The priority matrices must be
+        equal, and both precedence functions must agree with every relation of their own matrix.
+    """
+    from OperatorPriority.FormMatrix import FormMatrix
+
+    classic = FormMatrix(level_matrix.grammar)
+    if not classic.ts == level_matrix.ts:
+        return ["Terminal symbols differ, {} and {}.".format(classic.ts, level_matrix.ts)]
+    expected = classic.priority_matrix.copy()
+    start = classic.non_ts.index(level_matrix.grammar.non_ts[0])
+    expected[-1, (classic.first_matrix[start] == 1) & (expected[-1] == 0)] = -1
+    expected[(classic.last_matrix[start] == 1) & (expected[:, -1] == 0), -1] = 1
+    messages = []
+    for i, j in zip(*np.nonzero(expected != level_matrix.priority_matrix)):
+        messages.append("Relation of {} and {} is {} instead of {}.".format(
+            classic.ts[i], classic.ts[j], level_matrix.priority_matrix[i, j], expected[i, j]))
+    # Classic functions are checked against the relations they were built from.
+    for name, matrix, relations in (("classic", classic.floyd_matrix, classic.priority_matrix),
+                                    ("level", level_matrix.floyd_matrix, expected)):
+        sign = np.sign(matrix[0][:, None] - matrix[1][None, :])
+        known = (relations != 0) & (relations != 3)
+        relations = np.where(relations == 2, 0, relations)
+        for i, j in zip(*np.nonzero(known & (sign != relations))):
+            messages.append("{} precedence functions break relation of {} and {}.".format(
+                name, classic.ts[i], classic.ts[j]))
+    return messages
+
+
+if __name__ == "__main__":
+    from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+
+    level_matrix = LevelMatrix.from_file(os.path.join("data", "levels.txt"))
+    print("\n".join(cross_check(level_matrix)) or "Same tables as the classic construction.")
+    OperatorPriorityAn(None, level_matrix).scan_series("E0", "i * ( i + i ) - i / i".split(" "))
@@ -1,41 +1,96 @@
 import os
-
 import sys
+from time import perf_counter_ns
 
 sys.path.append(os.path.join("..", ""))
 
 from OperatorPriority.FormMatrix import FormMatrix
-from utils import init_grammar
-
-
-def get_terminal_index(formula):
-    """
-    Get all indexes of terminal symbol in a formula.
-
-    :param formula: str, the formula to be searched.
-    :return: set, containing all index number of terminal symbol in given formula.
-    """
-    result = set()
-    formula_list = formula.split(" ")
-    for i in range(len(formula_list)):
-        if not formula_list[i].isupper():
-            result.add(i)
-    return result
+from ParseCache import grammar_fingerprint
+from ParseTree import ReductionLog
+from utils import load_grammar
 
 
 class OperatorPriorityAn:
-    def __init__(self, grammar):
+    def __init__(self, grammar, form_matrix=None, stats=None):
+        """
+        :param grammar: pandas data frame, containing grammar details. Ignored if form_matrix is given.
+        :param form_matrix: FormMatrix or SharedTables.CompiledTables, already compiled tables to use
+            instead of compiling grammar.
+        :param stats: Instrumentation.ParseStats, optional, receives counters of every analysis.
+        """
         self.scan_index = 0
-        self.form_matrix = FormMatrix(grammar)
+        self.stats = stats
+        # Instrumentation.Profiler over self.productions, set it to profile every analysis.
+        self.profiler = None
+        # ParseCache, set it to reuse results of series analyzed before.
+        self.cache = None
+        if form_matrix is None:
+            # Build the tables now, so an invalid grammar fails here and not in a later analysis.
+            form_matrix = FormMatrix(grammar).build("floyd_matrix")
+        self.form_matrix = form_matrix
 
         self.ts = self.form_matrix.ts
         self.non_ts = self.form_matrix.non_ts
-
-        self.floyd_matrix = self.form_matrix.floyd_matrix
         self.floyd_index = self.form_matrix.floyd_index
 
         self.grammar = self.form_matrix.grammar
 
+        # Map every (non-terminal, formula) pair to its production id.
+        self.productions = self.form_matrix.productions
+        self.production_ids = dict()
+        for production, item in enumerate(self.productions):
+            self.production_ids.setdefault(item, production)
+
+        self.build_handle_index()
+        self.floyd_matrix = self.form_matrix.floyd_matrix
+
+    @property
+    def floyd_matrix(self):
+        return self.floyd_table
+
+    @floyd_matrix.setter
+    def floyd_matrix(self, matrix):
+        """
+        Use other f/g functions, e.g. loaded from a cache.
+        The values read by control and grammar_id, the key of self.cache, follow them.
+        """
+        self.floyd_table = matrix
+        # Plain python int lists, indexing numpy arrays creates a new scalar object every time.
+        self.f_values = [int(value) for value in matrix[self.floyd_index.index("f")]]
+        self.g_values = [int(value) for value in matrix[self.floyd_index.index("g")]]
+        self.grammar_id = grammar_fingerprint("operator", self.productions, {"floyd_matrix": matrix})
+
+    def build_handle_index(self):
+        """
+        Intern symbols into integer ids and build the structures used by control.
+
+        Terminal symbols get ids 0 .. len(ts) - 1 in the order of ts, non-terminal symbols
+        get ids starting from len(ts) in the order of non_ts. Since operator priority analysis
+        does not distinguish non-terminal symbols inside a phrase, every non-terminal is
+        matched by the single key non_t_base in handle_trie.
+        """
+        self.symbol_names = list(self.ts) + list(self.non_ts)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbol_names)}
+        self.non_t_base = len(self.ts)
+        self.end_id = self.symbol_ids["#"]
+
+        # handle_trie is a nested dict keyed by symbol id along the formula,
+        # the production id of a complete formula is stored under key -1.
+        # The first formula (in non_ts order) with a given shape wins.
+        self.handle_trie = dict()
+        self.production_lhs = [0] * len(self.productions)
+        for non_t in self.non_ts:
+            for formula in self.form_matrix.get_all_formulas(non_t):
+                node = self.handle_trie
+                for char in formula.split(" "):
+                    key = self.symbol_ids[char]
+                    if key >= self.non_t_base:
+                        key = self.non_t_base
+                    node = node.setdefault(key, dict())
+                production = self.production_ids[(non_t, formula)]
+                self.production_lhs[production] = self.symbol_ids[non_t]
+                node.setdefault(-1, production)
+
     def get_priority(self, first, second):
         """
         Get the priority relationship between first and second identifiers.
@@ -71,6 +126,28 @@ class OperatorPriorityAn:
             " ".join(stack), current, top, {0: "=", 1: ">", -1: "<"}[self.get_priority(top, current)], current,
             " -> ".join(formulas)))
 
+    def match_handle(self, stack, start_index):
+        """
+        Look for the production whose formula has the same shape as stack[start_index:].
+
+        :param stack: list, analysis stack of symbol ids.
+        :param start_index: int, index of the phrase's first symbol in stack.
+        :return: int, the matching production id, or -1 if there is none.
+        """
+        non_t_base = self.non_t_base
+        node = self.handle_trie
+        index = start_index
+        end = len(stack)
+        while index < end:
+            key = stack[index]
+            if key >= non_t_base:
+                key = non_t_base
+            node = node.get(key)
+            if node is None:
+                return -1
+            index += 1
+        return node.get(-1, -1)
+
     def get_non_t(self, replacing_formula):
         """
         Look for corresponding non-terminal symbol based on
@@ -80,98 +157,252 @@ class OperatorPriorityAn:
         :return: tuple (str, str), the corresponding non-terminal symbol and the found matching formula.
         :raise: KeyError when it is unable to find corresponding non-terminal symbol.
         """
-        t_in_formula = set()
-        if len(replacing_formula) == 1 and not replacing_formula.isupper():
-            for non_t in self.non_ts:
-                for formula in self.form_matrix.get_all_formulas(non_t):
-                    if formula == replacing_formula:
-                        return non_t, formula
-        for char in replacing_formula.split(" "):
-            if not char.isupper():
-                t_in_formula.add(char)
-        for non_t in self.non_ts:
-            for formula in self.form_matrix.get_all_formulas(non_t):
-                try:
-                    # Make sure that the formula contains operator we want to replace.
-                    if not (t_in_formula.issubset(formula.split(" ")) and
-                            len(formula.split(' ')) == len(replacing_formula.split(' '))):
-                        raise ValueError
-                    # Make sure that all operator are matched in place.
-                    for index in get_terminal_index(replacing_formula):
-                        if not replacing_formula.split(" ")[index] == formula.split(" ")[index]:
-                            raise ValueError
-                except ValueError:
-                    continue
-                return non_t, formula
-        raise KeyError("No matching formula for operator {}".format(" ".join(t_in_formula)))
+        chars = replacing_formula.split(" ")
+        production = -1
+        if all(char in self.symbol_ids for char in chars):
+            production = self.match_handle([self.symbol_ids[char] for char in chars], 0)
+        if production == -1:
+            raise KeyError("No matching formula for operator {}".format(
+                " ".join(char for char in chars if not char.isupper())))
+        return self.productions[production]
 
-    def control(self, start_symbol, input_series):
+    def control(self, start_symbol, input_series, log=None, trace=True, use_cache=True):
         """
         The control function of operator priority analyzer.
 
+        The analysis stack holds symbol ids, and t_positions holds the stack index of every
+        terminal in it, so the topmost terminal and the left end of the leftmost phrase are
+        found without skipping over non-terminals. The input is accepted when only one
+        non-terminal is left above '#' and the current symbol is '#'.
+
         :param start_symbol: str, start symbol of function.
         :param input_series: list, input identifier series.
+        :param log: ReductionLog, if given, every reduction's production id and token span is appended to it.
+        :param trace: bool, whether to print analysis process to console.
+        :param use_cache: bool, whether to look the series up in self.cache when trace is off.
+            A hit is counted by self.stats as a cache hit, and is not profiled.
         """
-        print("====Analysis Process====")
-        stack = ["#"]
+        if use_cache and self.cache is not None and not trace:
+            result = self.cache.get(self.grammar_id, start_symbol, input_series, log is not None)
+            if result is None:
+                return self.cache.analyze(self, start_symbol, input_series, log)
+            input_series.append("#")
+            self.scan_index = result.scan_index
+            if self.stats is not None:
+                self.stats.add_cache_hit(result.accepted)
+            return result.replay(log)
+
+        if trace:
+            print("====Analysis Process====")
         input_series.append("#")
 
-        self.scan_index = 0
+        symbol_ids = self.symbol_ids
+        scan_index = 0
+        stats = self.stats
+        profiler = self.profiler
+        stack = None
+        reductions = 0
+        probes = 0
+        max_depth = 0
+        accepted = False
+        try:
+            ids = []
+            for symbol in input_series:
+                if symbol not in symbol_ids or symbol_ids[symbol] >= self.non_t_base:
+                    raise ValueError("'{}' is not a terminal symbol of grammar.".format(symbol))
+                ids.append(symbol_ids[symbol])
+                scan_index += 1
+            scan_index = 0
+
+            f_values = self.f_values
+            g_values = self.g_values
+            end_id = self.end_id
+            names = self.symbol_names
+
+            stack = [end_id]
+            t_positions = [0]
+            # Index of the first input token covered by each stack item.
+            span_starts = [-1]
 
-        current = input_series[self.scan_index]
-        self.scan_index += 1
-        self.print_stack(stack, current)
+            if profiler is not None:
+                profile_log = ReductionLog()
+                reduction_ns = []
+                shifts = [0] * len(names)
+                handle_ns = 0
+                relation_ns = 0
+                last_cut = perf_counter_ns()
+
+            current = ids[scan_index]
+            scan_index += 1
+            if trace:
+                self.print_stack([names[i] for i in stack], names[current])
 
-        while True:
             while True:
-                if stack[-1].isupper():
-                    top = stack[-2]
+                top = stack[t_positions[-1]]
+                if profiler is None:
+                    shift = f_values[top] <= g_values[current]
                 else:
-                    top = stack[-1]
-                if self.get_priority(top, current) == 1:
-                    break
+                    clock = perf_counter_ns()
+                    shift = f_values[top] <= g_values[current]
+                    relation_ns += perf_counter_ns() - clock
+                if shift:
+                    if top == end_id and current == end_id:
+                        if len(stack) == 2:
+                            accepted = True
+                            return
+                        raise ValueError("Input series reduced to nothing.")
+                    if profiler is not None:
+                        shifts[current] += 1
+                    stack.append(current)
+                    t_positions.append(len(stack) - 1)
+                    span_starts.append(scan_index - 1)
+                    current = ids[scan_index]
+                    if trace:
+                        self.print_stack([names[i] for i in stack], names[current])
+                    scan_index += 1
+                    continue
+
+                if profiler is not None:
+                    clock = perf_counter_ns()
+                # Walk down terminal positions until the left terminal is lower than the right one.
+                right = len(t_positions) - 1
+                while right > 0 and f_values[stack[t_positions[right - 1]]] >= g_values[stack[t_positions[right]]]:
+                    right -= 1
+                if right == 0:
+                    raise ValueError("No leftmost phrase in stack.")
+                start_index = t_positions[right - 1] + 1
 
-                stack.append(current)
-                current = input_series[self.scan_index]
-                self.print_stack(stack, current)
-                self.scan_index += 1
+                production = self.match_handle(stack, start_index)
+                if profiler is not None:
+                    now = perf_counter_ns()
+                    handle_ns += now - clock
+                    if not production == -1:
+                        profile_log.append(production, span_starts[start_index], scan_index - 1)
+                        reduction_ns.append(now - last_cut)
+                        last_cut = now
+                if production == -1:
+                    raise KeyError("No matching formula for operator {}".format(
+                        " ".join(names[stack[i]] for i in t_positions[right:])))
+                non_t = self.production_lhs[production]
+                if stats is not None:
+                    reductions += 1
+                    probes += len(t_positions) - right + len(stack) - start_index
+                    if len(stack) > max_depth:
+                        max_depth = len(stack)
+                if log is not None:
+                    log.append(production, span_starts[start_index], scan_index - 1)
+                if trace:
+                    formula = " ".join(names[i] for i in stack[start_index:])
+                    formulas = [self.productions[production][1], names[non_t]]
+                    if not formula == formulas[0]:
+                        formulas.insert(0, formula)
 
-            start_index = len(stack) - 1
+                del stack[start_index:]
+                del t_positions[right:]
+                del span_starts[start_index + 1:]
+                stack.append(non_t)
+                if trace:
+                    self.print_stack([names[i] for i in stack], names[current], formulas)
+        finally:
+            self.scan_index = scan_index
+            if stats is not None:
+                if stack is None:
+                    stats.add(0, 0, 0, 0, False)
+                else:
+                    stats.add(scan_index - 1, reductions, probes, max(max_depth, len(stack)), accepted)
+            if profiler is not None and stack is not None:
+                profiler.add_parse(profile_log, reduction_ns,
+                                   {names[i]: count for i, count in enumerate(shifts) if count > 0},
+                                   handle_ns, relation_ns)
+
+    def initial_state(self):
+        """
+        :return: tuple (list, list, list), stack, terminal positions and span starts before the first token,
+            the state resume starts from.
+        """
+        return [self.end_id], [0], [-1]
+
+    def resume(self, start_symbol, input_series, position, state, log, checkpoints, interval, sync=None,
+               sync_from=0):
+        """
+        Continue an analysis from a saved state, for IncrementalParse.
+
+        The same analysis as control without trace, statistics, profiling and cache, and without
+        the check of all symbols control runs first, every symbol must be a terminal. The state at
+        a position depends only on the tokens before it: the stack right after shifting them,
+        before the reductions the next token triggers.
+
+        :param start_symbol: str, start symbol of function.
+        :param input_series: list, the whole input identifier series, ending with '#'.
+        :param position: int, index of the first token not read in state.
+        :param state: tuple, see initial_state, changed in place.
+        :param log: ReductionLog, receives the reductions.
+        :param checkpoints: list, receives a (position, state copy, log length) tuple at every shift
+            interval or more tokens past the last one in it.
+        :param interval: int, least number of tokens between two checkpoints.
+        :param sync: callable, called with (position, stack, span starts) after every shift from sync_from on,
+            the analysis stops if it returns True.
+        :param sync_from: int, first position to call sync at.
+        :return: bool, True if stopped by sync, False if the input is accepted.
+        """
+        symbol_ids = self.symbol_ids
+        f_values = self.f_values
+        g_values = self.g_values
+        end_id = self.end_id
+        stack, t_positions, span_starts = state
+        last = checkpoints[-1][0] if len(checkpoints) > 0 else position
+        scan_index = position
+        try:
+            current = symbol_ids[input_series[scan_index]]
+            scan_index += 1
             while True:
-                if stack[start_index].isupper():
-                    start_index -= 1
-                right = stack[start_index]
-                start_index -= 1
-                if stack[start_index].isupper():
-                    start_index -= 1
-
-                if self.get_priority(stack[start_index], right) == -1:
-                    break
-
-            formula = " ".join(stack[start_index + 1:])
-            non_t, choose_formula = self.get_non_t(formula)
-            del stack[start_index + 1:]
-            stack.append(non_t)
-
-            formulas = [choose_formula, non_t]
-            if not formula == choose_formula:
-                formulas.insert(0, formula)
-            self.print_stack(stack, current, formulas)
-
-            if non_t == start_symbol:
-                if not (len(stack) == 2 and self.scan_index == len(input_series)):
+                top = stack[t_positions[-1]]
+                if f_values[top] <= g_values[current]:
+                    if top == end_id and current == end_id:
+                        if len(stack) == 2:
+                            return False
+                        raise ValueError("Input series reduced to nothing.")
+                    stack.append(current)
+                    t_positions.append(len(stack) - 1)
+                    span_starts.append(scan_index - 1)
+                    if sync is not None and scan_index >= sync_from and sync(scan_index, stack, span_starts):
+                        return True
+                    if scan_index - last >= interval:
+                        checkpoints.append((scan_index, (list(stack), list(t_positions), list(span_starts)), len(log)))
+                        last = scan_index
+                    current = symbol_ids[input_series[scan_index]]
+                    scan_index += 1
                     continue
-                return
 
-    def scan_series(self, start_symbol, series):
+                right = len(t_positions) - 1
+                while right > 0 and f_values[stack[t_positions[right - 1]]] >= g_values[stack[t_positions[right]]]:
+                    right -= 1
+                if right == 0:
+                    raise ValueError("No leftmost phrase in stack.")
+                start_index = t_positions[right - 1] + 1
+                production = self.match_handle(stack, start_index)
+                if production == -1:
+                    raise KeyError("No matching formula for operator {}".format(
+                        " ".join(self.symbol_names[stack[i]] for i in t_positions[right:])))
+                log.append(production, span_starts[start_index], scan_index - 1)
+                del stack[start_index:]
+                del t_positions[right:]
+                del span_starts[start_index + 1:]
+                stack.append(self.production_lhs[production])
+        finally:
+            self.scan_index = scan_index
+
+    def scan_series(self, start_symbol, series, log=None, trace=True):
         """
         Scan on input series.
 
         :param series: list, containing input identifier series.
         :param start_symbol: str, the start symbol of grammar.
+        :param log: ReductionLog, optional, receives the reduction sequence of the analysis.
+        :param trace: bool, whether to print analysis process to console, self.cache is only used without it.
         """
         try:
-            self.control(start_symbol, series)
+            self.control(start_symbol, series, log, trace)
             print("Input series '{}' valid!".format(" ".join(series[:-1])))
         except (KeyError, ValueError, IndexError) as e:
             print("Error at position {}. {}".format(self.scan_index + 1, e))
@@ -179,5 +410,5 @@ class OperatorPriorityAn:
 
 
 if __name__ == "__main__":
-    an = OperatorPriorityAn(init_grammar(os.path.join("data", "grammar.txt"), "txt_file"))
+    an = OperatorPriorityAn(load_grammar(os.path.join("data", "grammar.txt")))
     an.scan_series("E", "i * i".split(" "))
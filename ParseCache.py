@@ -0,0 +1,193 @@
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from ParseTree import ReductionLog
+
+# Rough bytes of one entry besides its key tokens and reductions: key tuple, result object and dict slot.
+ENTRY_OVERHEAD = 200
+
+
+def grammar_fingerprint(kind, productions, tables=None):
+    """
+    :param kind: str, kind of analysis, like the analyzer class name.
+    :param productions: list, (non-terminal, formula) tuples of the compiled grammar.
+    :param tables: dict, name -> table the analysis reads, numpy array or anything with to_dense
+        like TableCompression.CompressedTable. Two analyzers of one grammar with different tables get different ids.
+    :return: str, id of the compiled grammar, the same for the same productions and tables in every process.
+    """
+    digests = []
+    for name, table in sorted((tables or dict()).items()):
+        if hasattr(table, "to_dense"):
+            table = table.to_dense()
+        table = np.ascontiguousarray(table, dtype=np.int64)
+        digests.append((name, table.shape, hashlib.blake2b(table.tobytes(), digest_size=8).hexdigest()))
+    text = repr((kind, [tuple(production) for production in productions], digests))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class CachedResult:
+    """
+    Outcome of one analysis: whether it accepted, the scan index it stopped at, the error it raised
+    if any, and its reductions as a flat array like ReductionLog.data if they are kept. A rejected
+    analysis keeps the reductions it performed before the error, like control leaves in its log.
+    """
+    __slots__ = ("accepted", "scan_index", "error_type", "error_args", "reductions")
+
+    def __init__(self, accepted, scan_index, error_type=None, error_args=(), reductions=None):
+        self.accepted = accepted
+        self.scan_index = scan_index
+        self.error_type = error_type
+        self.error_args = error_args
+        self.reductions = reductions
+
+    @property
+    def nbytes(self):
+        return 0 if self.reductions is None else self.reductions.itemsize * len(self.reductions)
+
+    def replay(self, log=None):
+        """
+        Repeat the outcome of the analysis.
+
+        :param log: ReductionLog, optional, receives the cached reductions.
+        :raise: The error of the analysis, if it rejected its input series.
+        """
+        if log is not None and self.reductions is not None:
+            log.data.extend(self.reductions)
+        if not self.accepted:
+            raise self.error_type(*self.error_args)
+
+
+class ParseCache:
+    """
+    Thread-safe LRU cache of analysis results, keyed by compiled grammar id, start symbol and input series.
+
+    The cache holds results of one compiled grammar at a time: a lookup or store with another
+    grammar id clears it first. Entries are evicted least recently used first whenever there are
+    more than max_entries of them, or they take more than max_bytes by a rough estimate.
+    Assign it to the cache attribute of analyzers, it is used by control when trace is off,
+    and may be shared by analyzers of the same grammar across threads.
+
+    :param max_entries: int, most entries to keep.
+    :param max_bytes: int, most estimated bytes to keep.
+    :param keep_logs: bool, whether to keep the reductions of every series, so log arguments are filled on hits.
+        Without them a lookup with a log argument is counted as a miss and analyzed again.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, keep_logs=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.keep_logs = keep_logs
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.grammar_id = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clears = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self.grammar_id = None
+
+    def switch_grammar(self, grammar_id):
+        # Called with lock held.
+        if not grammar_id == self.grammar_id:
+            if len(self.entries) > 0:
+                self.clears += 1
+            self.entries.clear()
+            self.nbytes = 0
+            self.grammar_id = grammar_id
+
+    def get(self, grammar_id, start_symbol, series, need_log=False):
+        """
+        :param grammar_id: str, id of the compiled grammar, see grammar_fingerprint.
+        :param start_symbol: str, start symbol of grammar.
+        :param series: list, input identifier series, without the ending '#'.
+        :param need_log: bool, whether the caller needs the reductions.
+        :return: CachedResult, or None on a miss.
+        """
+        key = (start_symbol, tuple(series))
+        with self.lock:
+            self.switch_grammar(grammar_id)
+            entry = self.entries.get(key)
+            if entry is None or (need_log and entry[0].reductions is None):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, grammar_id, start_symbol, series, result):
+        """
+        :param grammar_id: str, id of the compiled grammar.
+        :param start_symbol: str, start symbol of grammar.
+        :param series: list, input identifier series, without the ending '#'.
+        :param result: CachedResult.
+        """
+        key = (start_symbol, tuple(series))
+        size = ENTRY_OVERHEAD + 8 * len(series) + result.nbytes
+        with self.lock:
+            self.switch_grammar(grammar_id)
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (result, size)
+            self.nbytes += size
+            while len(self.entries) > self.max_entries or (self.nbytes > self.max_bytes and len(self.entries) > 0):
+                self.nbytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def analyze(self, analyzer, start_symbol, input_series, log=None):
+        """
+        Analyze input_series with analyzer and store the outcome, on a miss of control.
+
+        :param analyzer: OperatorPriorityAn or SimplePriority.
+        :param start_symbol: str, start symbol of grammar.
+        :param input_series: list, input identifier series, '#' is appended like control does.
+        :param log: ReductionLog, optional, receives the reductions.
+        """
+        series = list(input_series)
+        run_log = ReductionLog() if self.keep_logs or log is not None else None
+        try:
+            analyzer.control(start_symbol, input_series, run_log, trace=False, use_cache=False)
+        except (KeyError, ValueError, IndexError) as e:
+            self.store(analyzer, start_symbol, series, CachedResult(False, analyzer.scan_index, type(e), e.args),
+                       run_log, log)
+            raise
+        self.store(analyzer, start_symbol, series, CachedResult(True, analyzer.scan_index), run_log, log)
+
+    def store(self, analyzer, start_symbol, series, result, run_log, log):
+        """
+        Attach the reductions of an analysis run by analyze to its result, and put it into the cache.
+        """
+        if run_log is not None:
+            if log is not None:
+                log.data.extend(run_log.data)
+            if self.keep_logs:
+                result.reductions = array("i", run_log.data)
+        self.put(analyzer.grammar_id, start_symbol, series, result)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def as_dict(self):
+        return {"entries": len(self.entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate, "evictions": self.evictions, "clears": self.clears}
+
+    def print_stats(self):
+        print("====Parse cache====")
+        for name, value in self.as_dict().items():
+            print("{:17}{}".format(name, value))
+        print()
@@ -0,0 +1,135 @@
+from array import array
+
+
+class ReductionLog:
+    """
+    Compact record of the reductions performed by one analysis.
+
+    Every reduction is stored as three integers in a single flat array:
+    the production id (row position of the formula in the grammar) and the
+    half-open token span [start, end) of input series the reduced phrase covers.
+    Reductions are appended bottom-up, so the log is the post-order of the parse tree.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self):
+        self.data = array("i")
+
+    def __len__(self):
+        return len(self.data) // 3
+
+    def __getitem__(self, index):
+        """
+        :param index: int, index of the reduction.
+        :return: tuple (int, int, int), production id, span start and span end.
+        """
+        if index < 0:
+            index += len(self)
+        base = index * 3
+        return self.data[base], self.data[base + 1], self.data[base + 2]
+
+    def __iter__(self):
+        data = self.data
+        for base in range(0, len(data), 3):
+            yield data[base], data[base + 1], data[base + 2]
+
+    def append(self, production, start, end):
+        """
+        Record one reduction.
+
+        :param production: int, production id of the formula used.
+        :param start: int, index of the first token covered by the reduced phrase.
+        :param end: int, index after the last token covered by the reduced phrase.
+        """
+        data = self.data
+        data.append(production)
+        data.append(start)
+        data.append(end)
+
+    def clear(self):
+        del self.data[:]
+
+    def productions(self):
+        """
+        :return: array, production ids of all reductions in order.
+        """
+        return self.data[0::3]
+
+    def to_tree(self):
+        """
+        :return: ParseTree, tree view built from this log.
+        """
+        return ParseTree(self)
+
+
+class ParseTree:
+    """
+    Parse tree stored as parallel arrays, one slot per reduction of a ReductionLog.
+
+    Node i is the i-th reduction of the log. parent, first_child and next_sibling hold
+    node indexes (-1 for none), production holds the production id and span_start/span_end
+    the token span. Terminal leaves are not stored, they are the input tokens in a span
+    not covered by any child.
+    """
+    __slots__ = ("parent", "production", "first_child", "next_sibling", "span_start", "span_end")
+
+    def __init__(self, log):
+        count = len(log)
+        self.parent = array("i", [-1]) * count
+        self.first_child = array("i", [-1]) * count
+        self.next_sibling = array("i", [-1]) * count
+        self.production = log.data[0::3]
+        self.span_start = log.data[1::3]
+        self.span_end = log.data[2::3]
+
+        # Nodes finished but not yet attached to a parent.
+        # Since the log is post-order, the children of a node are exactly the
+        # pending nodes at the top whose span starts inside the node's span.
+        pending = []
+        for node in range(count):
+            start = self.span_start[node]
+            while len(pending) > 0 and self.span_start[pending[-1]] >= start:
+                child = pending.pop()
+                self.parent[child] = node
+                # Children are popped right to left, prepend to keep them in input order.
+                self.next_sibling[child] = self.first_child[node]
+                self.first_child[node] = child
+            pending.append(node)
+
+    def __len__(self):
+        return len(self.production)
+
+    @property
+    def root(self):
+        """
+        :return: int, index of the root node, -1 if the tree is empty.
+        """
+        return len(self.production) - 1
+
+    def children(self, node):
+        """
+        :param node: int, index of the node.
+        :return: generator, indexes of the node's children in input order.
+        """
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def print_tree(self, productions, node=None, depth=0):
+        """
+        Print the tree to console, one reduction per line.
+
+        :param productions: list, (non-terminal, formula) tuples indexed by production id.
+        :param node: int, the node to start from, default to root.
+        :param depth: int, indent level of the node.
+        """
+        if node is None:
+            node = self.root
+            if node < 0:
+                return
+        non_t, formula = productions[self.production[node]]
+        print("{}{} -> {}  [{}, {})".format(
+            "  " * depth, non_t, formula, self.span_start[node], self.span_end[node]))
+        for child in self.children(node):
+            self.print_tree(productions, child, depth + 1)
@@ -0,0 +1,296 @@
+import os
+from string import Template
+
+HEADER = Template('''"""
+Standalone $kind analyzer for grammar with start symbol '$start', generated by ParserGenerator.
+Do not edit, generate again from the grammar instead.
+
+$returns
+Raise ParseError carrying the 0-based token position if the input series is not valid.
+"""
+
+
+class ParseError(ValueError):
+    def __init__(self, position, message):
+        super().__init__(message)
+        self.position = position
+
+
+# (non-terminal, formula) of every production, indexed by production id.
+PRODUCTIONS = $productions
+''')
+
+OPERATOR_BODY = Template('''TERMINALS = $terminals
+NON_TERMINALS = $non_terminals
+TERMINAL_IDS = {t: i for i, t in enumerate(TERMINALS)}
+END = $end
+# Every non-terminal symbol has an id not less than NT, and is matched by key NT in HANDLES.
+NT = len(TERMINALS)
+F = $f_values
+G = $g_values
+# Nested dict keyed by symbol id along a formula, production id is stored under key -1.
+HANDLES = $handles
+PRODUCTION_LHS = $production_lhs
+
+
+def parse(tokens):
+    ids = []
+    for position, token in enumerate(tokens):
+        symbol = TERMINAL_IDS.get(token)
+        if symbol is None or symbol == END:
+            raise ParseError(position, "'{}' is not a terminal symbol of grammar.".format(token))
+        ids.append(symbol)
+    ids.append(END)
+
+    reductions = []
+    stack = [END]
+    t_positions = [0]
+    span_starts = [-1]
+    current = ids[0]
+    scan_index = 1
+    while True:
+        top = stack[t_positions[-1]]
+        if F[top] <= G[current]:
+            if top == END and current == END:
+                if len(stack) == 2:
+                    return reductions
+                raise ParseError(scan_index - 1, "Input series reduced to nothing.")
+            if scan_index == len(ids):
+                raise ParseError(scan_index - 1, "Unexpected end of input series.")
+            stack.append(current)
+            t_positions.append(len(stack) - 1)
+            span_starts.append(scan_index - 1)
+            current = ids[scan_index]
+            scan_index += 1
+            continue
+
+        right = len(t_positions) - 1
+        while right > 0 and F[stack[t_positions[right - 1]]] >= G[stack[t_positions[right]]]:
+            right -= 1
+        if right == 0:
+            raise ParseError(scan_index - 1, "No leftmost phrase in stack.")
+        start_index = t_positions[right - 1] + 1
+
+        node = HANDLES
+        for index in range(start_index, len(stack)):
+            key = stack[index]
+            node = node.get(key if key < NT else NT)
+            if node is None:
+                break
+        production = -1 if node is None else node.get(-1, -1)
+        if production == -1:
+            raise ParseError(scan_index - 1, "No matching formula for operator {}".format(
+                " ".join(TERMINALS[stack[i]] for i in t_positions[right:])))
+
+        reductions.append((production, span_starts[start_index], scan_index - 1))
+        del stack[start_index:]
+        del t_positions[right:]
+        del span_starts[start_index + 1:]
+        stack.append(PRODUCTION_LHS[production])
+''')
+
+SIMPLE_BODY = Template('''SYMBOLS = $symbols
+SYMBOL_IDS = {s: i for i, s in enumerate(SYMBOLS)}
+N = len(SYMBOLS)
+END = -1
+START = $start_id
+# Relation matrix in row-major order as signed bytes, 0 means N/A, 1 prior, -1 lower, 2 equal.
+RELATION = memoryview($relation).cast("b")
+# Formula as symbol id tuple -> production id.
+REDUCTIONS = $reductions
+PRODUCTION_LHS = $production_lhs
+
+
+def priority(first, second):
+    if first == END:
+        return -1
+    if second == END:
+        return 1
+    relation = RELATION[first * N + second]
+    if relation == 2:
+        return 0
+    return relation
+
+
+def parse(tokens):
+    ids = []
+    for position, token in enumerate(tokens):
+        symbol = SYMBOL_IDS.get(token)
+        if symbol is None:
+            raise ParseError(position, "'{}' is not a symbol of grammar.".format(token))
+        ids.append(symbol)
+    ids.append(END)
+
+    reductions = []
+    stack = [END]
+    span_starts = [-1]
+    current = ids[0]
+    scan_index = 1
+    while True:
+        while not priority(stack[-1], current) == 1:
+            if scan_index == len(ids):
+                raise ParseError(scan_index - 1, "Unexpected end of input series.")
+            stack.append(current)
+            span_starts.append(scan_index - 1)
+            current = ids[scan_index]
+            scan_index += 1
+
+        start_index = len(stack) - 1
+        while not priority(stack[start_index - 1], stack[start_index]) == -1:
+            start_index -= 1
+
+        production = REDUCTIONS.get(tuple(stack[start_index:]))
+        if production is None:
+            raise ParseError(scan_index - 1, "No matching formula for {}".format(
+                " ".join(SYMBOLS[i] for i in stack[start_index:])))
+        non_t = PRODUCTION_LHS[production]
+        reductions.append((production, span_starts[start_index], scan_index - 1))
+        del stack[start_index:]
+        del span_starts[start_index + 1:]
+        stack.append(non_t)
+
+        if non_t == START and len(stack) == 2 and scan_index == len(ids):
+            return reductions
+''')
+
+LL1_BODY = Template('''START = $start
+# Analysis sheet, non-terminal -> {terminal: production id}.
+TABLE = $table
+# Formula symbols of every production, indexed by production id.
+RHS = $rhs
+
+
+def parse(tokens):
+    tokens = list(tokens)
+    tokens.append("#")
+
+    derivation = []
+    stack = ["#", START]
+    position = 0
+    while True:
+        top = stack.pop()
+        current = tokens[position]
+        if top == "#":
+            if current == "#":
+                return derivation
+            raise ParseError(position, "Unexpected '{}' after end of sentence.".format(current))
+        row = TABLE.get(top)
+        if row is None:
+            if not top == current:
+                raise ParseError(position, "Expect '{}' but got '{}'.".format(top, current))
+            position += 1
+            continue
+        production = row.get(current)
+        if production is None:
+            raise ParseError(position, "No formula of {} for '{}'.".format(top, current))
+        derivation.append(production)
+        rhs = RHS[production]
+        if not rhs == ("e",):
+            stack.extend(reversed(rhs))
+''')
+
+
+def generate_operator(form_matrix, start_symbol):
+    """
+    :param form_matrix: OperatorPriority FormMatrix, or CompiledTables of operator kind.
+    :param start_symbol: str, start symbol of grammar.
+    :return: str, source of the analyzer module.
+    """
+    from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+
+    analyzer = OperatorPriorityAn(None, form_matrix)
+    header = HEADER.substitute(
+        kind="operator priority", start=start_symbol, productions=repr(tuple(analyzer.productions)),
+        returns="parse(tokens) returns the reductions as a list of (production id, start, end) tuples.")
+    body = OPERATOR_BODY.substitute(
+        terminals=repr(tuple(analyzer.ts)), non_terminals=repr(tuple(analyzer.non_ts)),
+        end=analyzer.end_id, f_values=repr(tuple(analyzer.f_values)), g_values=repr(tuple(analyzer.g_values)),
+        handles=repr(analyzer.handle_trie), production_lhs=repr(tuple(analyzer.production_lhs)))
+    return header + "\n" + body
+
+
+def generate_simple(form_matrix, start_symbol):
+    """
+    :param form_matrix: SimplePriority FormMatrix, or CompiledTables of simple kind.
+    :param start_symbol: str, start symbol of grammar.
+    :return: str, source of the analyzer module.
+    """
+    symbols = list(form_matrix.symbols)
+    symbol_ids = {symbol: i for i, symbol in enumerate(symbols)}
+    reductions = dict()
+    production_lhs = []
+    for production, (non_t, formula) in enumerate(form_matrix.productions):
+        production_lhs.append(symbol_ids[non_t])
+        reductions.setdefault(tuple(symbol_ids[char] for char in formula.split(" ")), production)
+    relation = bytes(int(value) & 0xFF for value in form_matrix.relation_matrix.ravel())
+
+    header = HEADER.substitute(
+        kind="simple priority", start=start_symbol, productions=repr(tuple(form_matrix.productions)),
+        returns="parse(tokens) returns the reductions as a list of (production id, start, end) tuples.")
+    body = SIMPLE_BODY.substitute(
+        symbols=repr(tuple(symbols)), start_id=symbol_ids[start_symbol], relation=repr(relation),
+        reductions=repr(reductions), production_lhs=repr(tuple(production_lhs)))
+    return header + "\n" + body
+
+
+def generate_ll1(map_construct, start_symbol):
+    """
+    :param map_construct: AnMapConstruct, construct_map is called if the sheet is not built yet,
+        or was built for another start symbol.
+    :param start_symbol: str, start symbol of grammar.
+    :return: str, source of the analyzer module.
+    """
+    if not map_construct.start_symbol == start_symbol:
+        # construct_map keeps FOLLOW sets built before, which may be for another start symbol.
+        map_construct.follow_dict = dict()
+        map_construct.an_map = dict()
+        map_construct.construct_map(start_symbol)
+    productions = map_construct.grammar.productions
+    production_ids = dict()
+    for production, item in enumerate(productions):
+        production_ids.setdefault(item, production)
+    table = {non_t: {t: production_ids[(non_t, formula)] for t, formula in row.items()}
+             for non_t, row in map_construct.an_map.items()}
+
+    header = HEADER.substitute(
+        kind="LL(1)", start=start_symbol, productions=repr(tuple(productions)),
+        returns="parse(tokens) returns the production ids of the leftmost derivation in order.")
+    body = LL1_BODY.substitute(
+        start=repr(start_symbol), table=repr(table),
+        rhs=repr(tuple(tuple(formula.split(" ")) for non_t, formula in productions)))
+    return header + "\n" + body
+
+
+def generate_module(source, start_symbol="E"):
+    """
+    Generate the source of a standalone analyzer module with all tables embedded as literals.
+    The module has no dependency on pandas, numpy or the grammar file.
+
+    :param source: OperatorPriority FormMatrix, SimplePriority FormMatrix, SharedTables.CompiledTables
+        or AnMapConstruct.
+    :param start_symbol: str, start symbol of grammar.
+    :return: str, source of the analyzer module.
+    """
+    if hasattr(source, "an_map"):
+        return generate_ll1(source, start_symbol)
+    if hasattr(source, "floyd_matrix"):
+        return generate_operator(source, start_symbol)
+    if hasattr(source, "relation_matrix"):
+        return generate_simple(source, start_symbol)
+    raise ValueError("Unable to generate analyzer from {}.".format(type(source).__name__))
+
+
+def write_module(source, file_name, start_symbol="E"):
+    """
+    Generate a standalone analyzer module and write it into a python file.
+
+    :param source: OperatorPriority FormMatrix, SimplePriority FormMatrix, SharedTables.CompiledTables
+        or AnMapConstruct.
+    :param file_name: str, the directory of the python file to write.
+    :param start_symbol: str, start symbol of grammar.
+    """
+    directory = os.path.dirname(file_name)
+    if len(directory) > 0 and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(file_name, "w") as file:
+        file.write(generate_module(source, start_symbol))
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class PreValidator:
+    """
+    Batch check rejecting input series with two adjacent symbols which have no relation.
+
+    In a sentence of an operator grammar, two adjacent terminals always have a relation in the
+    priority matrix, '#' included at both ends, and in a sentence of a simple priority grammar two
+    adjacent symbols always have one in the relation matrix. A series holding a pair without one
+    can not be a sentence, so it is rejected before the shift-reduce analysis. The check is
+    conservative: a series passing it may still be rejected by the analysis.
+
+    All series of a batch are mapped to ids, joined with '#' between them, and the relation of
+    every adjacent pair is gathered with one numpy indexing.
+    """
+
+    def __init__(self, form_matrix):
+        """
+        :param form_matrix: OperatorPriority FormMatrix, LevelMatrix, SimplePriority FormMatrix
+            or SharedTables.CompiledTables.
+        """
+        if hasattr(form_matrix, "priority_matrix"):
+            table = form_matrix.priority_matrix
+            symbols = list(form_matrix.ts)
+        else:
+            table = form_matrix.relation_matrix
+            symbols = list(form_matrix.symbols) + ["#"]
+        if hasattr(table, "to_dense"):
+            table = table.to_dense()
+        table = np.asarray(table)
+
+        # One more row and column for symbols not in grammar, related to nothing.
+        size = len(symbols) + 1
+        self.related = np.zeros((size, size), bool)
+        self.related[:table.shape[0], :table.shape[1]] = table != 0
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(symbols)}
+        self.end_id = self.symbol_ids["#"]
+        self.unknown_id = size - 1
+        if not hasattr(form_matrix, "priority_matrix"):
+            # Simple priority analysis puts '#' below and above everything.
+            self.related[self.end_id, :self.unknown_id] = True
+            self.related[:self.unknown_id, self.end_id] = True
+
+    def check(self, series):
+        """
+        :param series: list, input identifier series, without the ending '#'.
+        :return: int, position of the first symbol without relation to the one before it,
+            len(series) if it is the ending '#', or -1 if the series passes.
+        """
+        return int(self.check_batch([series])[0])
+
+    def check_batch(self, batch):
+        """
+        :param batch: list, input identifier series, without the ending '#'.
+        :return: numpy array, for every series, the position of the first symbol without relation
+            to the one before it, len(series) if it is the ending '#', or -1 if the series passes.
+        """
+        symbol_ids = self.symbol_ids
+        unknown_id = self.unknown_id
+        ids = [self.end_id]
+        # Index in ids of the '#' before every series.
+        starts = np.empty(len(batch) + 1, np.int64)
+        for index, series in enumerate(batch):
+            starts[index] = len(ids) - 1
+            ids += [symbol_ids.get(symbol, unknown_id) for symbol in series]
+            ids.append(self.end_id)
+        starts[len(batch)] = len(ids) - 1
+        ids = np.array(ids, np.int32)
+
+        bad = np.nonzero(~self.related[ids[:-1], ids[1:]])[0]
+        result = np.full(len(batch), -1, np.int64)
+        if len(bad) > 0:
+            # Pair k joins ids k and k + 1, its series is the last one starting at or before k.
+            owners = np.searchsorted(starts, bad, side="right") - 1
+            owners, first = np.unique(owners, return_index=True)
+            result[owners] = bad[first] - starts[owners]
+        return result
+
+    def split(self, batch):
+        """
+        :param batch: list, input identifier series, without the ending '#'.
+        :return: tuple (list, dict), indexes of the series passing the check,
+            and index -> rejected position of the others.
+        """
+        positions = self.check_batch(batch)
+        survivors = np.nonzero(positions < 0)[0].tolist()
+        rejected = {int(index): int(positions[index]) for index in np.nonzero(positions >= 0)[0]}
+        return survivors, rejected
@@ -0,0 +1,302 @@
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from ParseTree import ReductionLog
+from SharedTables import CompiledTables
+from SimplePriority.SimplePriorityAn import SimplePriority
+
+# Codings of coding.csv: ';' and '}' end a top-level statement, '(' '{' '[' and ')' '}' ']' nest.
+# A '}' ending a statement belongs to it, a ';' to none.
+DELIMITERS = (26, 35)
+OPENERS = (28, 34, 36)
+CLOSERS = (29, 35, 37)
+END_CODING = 52
+MODES = ("serial", "thread", "process")
+# Table kind -> analyzer class.
+ANALYZERS = {"operator": OperatorPriorityAn, "simple": SimplePriority}
+# Aim at this many tasks per worker, so a slow chunk does not leave the others idle.
+TASKS_PER_WORKER = 4
+
+# Analyzer of a pool process, set by init_worker.
+worker_state = dict()
+
+
+def split_segments(coding_array, delimiters=DELIMITERS, openers=OPENERS, closers=CLOSERS):
+    """
+    Find the top-level statements of a coding array.
+
+    The bracket depth after every token is the running count of openers minus closers, taken
+    with one cumulative sum and clamped at 0: a closer with no opener left to match does not
+    count, so the brackets after it nest as usual. A delimiter whose depth after it is 0 ends
+    a segment, so a '}' closing the outermost block ends one but a ';' inside parentheses or
+    braces does not. A closing delimiter stays at the end of the segment it
+    ends, so a top-level block keeps its '}', while separators like ';' are dropped. Empty
+    segments are left out. A trailing end coding, as appended by utils.load_coding, is ignored.
+    An opener never closed keeps the depth above 0, so the rest of the array becomes one segment.
+
+    :param coding_array: list or numpy array, the lexical coding series.
+    :param delimiters: tuple, codings ending a top-level segment.
+    :param openers: tuple, codings opening a bracket.
+    :param closers: tuple, codings closing a bracket.
+    :return: tuple (numpy array, numpy array), start and end (exclusive) index of every segment.
+    """
+    codings = np.asarray(coding_array, dtype=np.int64)
+    if len(codings) > 0 and codings[-1] == END_CODING:
+        codings = codings[:-1]
+    count = np.cumsum(np.isin(codings, openers).astype(np.int64) - np.isin(codings, closers))
+    # Clamping a running sum at 0 lifts it by the lowest value it reached so far.
+    depth = count - np.minimum(np.minimum.accumulate(count), 0)
+    cuts = np.nonzero(np.isin(codings, delimiters) & (depth == 0))[0]
+    starts = np.concatenate(([0], cuts + 1))
+    ends = np.concatenate((cuts + np.isin(codings[cuts], closers), [len(codings)]))
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+def table_kind(form_matrix):
+    """
+    :param form_matrix: OperatorPriority or SimplePriority FormMatrix, LevelMatrix or CompiledTables.
+    :return: str, "operator" or "simple".
+    """
+    return "operator" if hasattr(form_matrix, "priority_matrix") else "simple"
+
+
+def parse_segments(analyzer, desc_map, start_symbol, codings, offset, bounds, keep_log):
+    """
+    Parse a chunk of segments one after another.
+
+    :param analyzer: OperatorPriorityAn or SimplePriority, used by this thread or process only.
+    :param desc_map: dict, coding -> terminal symbol.
+    :param start_symbol: str, start symbol of grammar.
+    :param codings: list, codings of the chunk, from global index offset on.
+    :param offset: int, global index of codings[0].
+    :param bounds: list, global (start, end) of every segment in the chunk.
+    :param keep_log: bool, whether to return the reductions.
+    :return: list, (error position or -1, error message, reductions) of every segment.
+        Positions and reduction spans are global indexes of the coding array.
+    """
+    results = []
+    for start, end in bounds:
+        segment = codings[start - offset:end - offset]
+        log = ReductionLog() if keep_log else None
+        position = -1
+        message = None
+        try:
+            series = [desc_map[coding] for coding in segment]
+        except KeyError:
+            unmapped = next(index for index, coding in enumerate(segment) if coding not in desc_map)
+            position = start + unmapped
+            message = "No valid identifier matching coding {}".format(segment[unmapped])
+        else:
+            try:
+                analyzer.control(start_symbol, series, log, trace=False)
+            except (KeyError, ValueError, IndexError) as e:
+                position = start + analyzer.scan_index
+                message = str(e)
+        reductions = None
+        if keep_log and len(log.data) > 0:
+            spans = np.frombuffer(log.data, dtype=np.int32).reshape(-1, 3).copy()
+            spans[:, 1:] += start
+            reductions = array("i", spans.tobytes())
+        results.append((position, message, reductions))
+    return results
+
+
+def init_worker(kind, block_name, desc_map, start_symbol, keep_log):
+    """
+    Build the analyzer of a pool process over the tables published by its parent.
+    """
+    tables = CompiledTables.attach(block_name)
+    worker_state["tables"] = tables
+    worker_state["analyzer"] = ANALYZERS[kind](None, tables)
+    worker_state["args"] = (desc_map, start_symbol)
+    worker_state["keep_log"] = keep_log
+
+
+def run_worker_chunk(codings, offset, bounds):
+    desc_map, start_symbol = worker_state["args"]
+    return parse_segments(worker_state["analyzer"], desc_map, start_symbol, codings, offset, bounds,
+                          worker_state["keep_log"])
+
+
+class SegmentedResult:
+    """
+    Merged outcome of a segmented analysis.
+
+    :param starts: numpy array, global start index of every segment.
+    :param ends: numpy array, global end index (exclusive) of every segment.
+    :param errors: dict, segment index -> (global error position, message) of rejected segments.
+    :param log: ReductionLog, reductions of all segments in order, spans as global indexes, or None.
+    """
+
+    def __init__(self, starts, ends, errors, log=None):
+        self.starts = starts
+        self.ends = ends
+        self.errors = errors
+        self.log = log
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def accepted(self):
+        return len(self.errors) == 0
+
+    def first_error(self):
+        """
+        :return: tuple (int, str), global position and message of the first error, or None.
+        """
+        if len(self.errors) == 0:
+            return None
+        return self.errors[min(self.errors)]
+
+    def print_errors(self):
+        for index in sorted(self.errors):
+            position, message = self.errors[index]
+            print("Error in segment {} at position {}. {}".format(index + 1, position + 1, message))
+
+
+class SegmentedParser:
+    """
+    Parse a long coding array as independent top-level segments, see split_segments.
+
+    Segments are grouped into chunks of about equal token counts, which are parsed by a pool
+    against the same compiled grammar and merged back in order. With the "process" mode the
+    tables are published once into shared memory (SharedTables) and every process attaches its
+    own analyzer to them, so work scales with the number of cores. The "thread" mode keeps one
+    analyzer per thread over the same tables; it only runs in parallel on an interpreter
+    without the global lock. The "serial" mode parses the chunks in the calling thread.
+
+    Use it as a context manager, or call close, to shut the pool down.
+    """
+
+    def __init__(self, form_matrix, start_symbol, desc_map, mode="process", workers=None,
+                 delimiters=DELIMITERS, openers=OPENERS, closers=CLOSERS):
+        """
+        :param form_matrix: OperatorPriority or SimplePriority FormMatrix, LevelMatrix or CompiledTables.
+        :param start_symbol: str, start symbol of grammar.
+        :param desc_map: dict, coding -> terminal symbol, see utils.get_description_map.
+        :param mode: str, "serial", "thread" or "process".
+        :param workers: int, pool size, default to the number of cores.
+        :param delimiters: tuple, codings ending a top-level segment.
+        :param openers: tuple, codings opening a bracket.
+        :param closers: tuple, codings closing a bracket.
+        """
+        if mode not in MODES:
+            raise ValueError("Unknown segmented parse mode {}.".format(mode))
+        self.form_matrix = form_matrix
+        self.kind = table_kind(form_matrix)
+        self.start_symbol = start_symbol
+        self.desc_map = desc_map
+        self.mode = mode
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.delimiters = delimiters
+        self.openers = openers
+        self.closers = closers
+        self.local = threading.local()
+        self.pool = None
+        self.pool_keeps_log = None
+        self.block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def get_analyzer(self):
+        """
+        :return: OperatorPriorityAn or SimplePriority, the analyzer of the calling thread.
+        """
+        analyzer = getattr(self.local, "analyzer", None)
+        if analyzer is None:
+            analyzer = self.local.analyzer = ANALYZERS[self.kind](None, self.form_matrix)
+        return analyzer
+
+    def run_chunk(self, codings, offset, bounds, keep_log):
+        return parse_segments(self.get_analyzer(), self.desc_map, self.start_symbol, codings, offset, bounds,
+                              keep_log)
+
+    def get_pool(self, keep_log):
+        if self.pool is not None and self.pool_keeps_log == keep_log:
+            return self.pool
+        self.close()
+        if self.mode == "thread":
+            self.pool = ThreadPoolExecutor(self.workers)
+        else:
+            tables = self.form_matrix
+            if not isinstance(tables, CompiledTables):
+                tables = CompiledTables.from_form_matrix(tables)
+            self.block = tables.publish()
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(
+                self.kind, self.block.name, self.desc_map, self.start_symbol, keep_log))
+        self.pool_keeps_log = keep_log
+        return self.pool
+
+    def chunk(self, starts, ends):
+        """
+        Group segments into chunks of about equal token counts.
+
+        :return: list, (first segment, end segment) index ranges.
+        """
+        count = len(starts)
+        tasks = 1 if self.mode == "serial" else self.workers * TASKS_PER_WORKER
+        if count == 0:
+            return []
+        sizes = np.cumsum(ends - starts)
+        targets = sizes[-1] * np.arange(1, tasks) / tasks
+        cuts = np.unique(np.searchsorted(sizes, targets, side="right"))
+        cuts = cuts[(cuts > 0) & (cuts < count)]
+        edges = [0] + cuts.tolist() + [count]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def parse(self, coding_array, keep_log=True):
+        """
+        Split coding_array into segments, parse them and merge the results.
+
+        :param coding_array: list or numpy array, the lexical coding series, possibly ending with the end coding.
+        :param keep_log: bool, whether to collect the reductions into the result's log.
+        :return: SegmentedResult.
+        """
+        starts, ends = split_segments(coding_array, self.delimiters, self.openers, self.closers)
+        codings = coding_array.tolist() if isinstance(coding_array, np.ndarray) else coding_array
+        chunks = []
+        for first, last in self.chunk(starts, ends):
+            offset = int(starts[first])
+            bounds = list(zip(starts[first:last].tolist(), ends[first:last].tolist()))
+            chunks.append((codings[offset:int(ends[last - 1])], offset, bounds))
+
+        if self.mode == "serial":
+            outcomes = [self.run_chunk(codings, offset, bounds, keep_log) for codings, offset, bounds in chunks]
+        elif self.mode == "thread":
+            pool = self.get_pool(keep_log)
+            outcomes = pool.map(lambda task: self.run_chunk(*task, keep_log), chunks)
+        else:
+            pool = self.get_pool(keep_log)
+            outcomes = pool.map(run_worker_chunk, *zip(*chunks)) if len(chunks) > 0 else []
+
+        log = ReductionLog() if keep_log else None
+        errors = dict()
+        index = 0
+        for outcome in outcomes:
+            for position, message, reductions in outcome:
+                if position >= 0:
+                    errors[index] = (position, message)
+                if reductions is not None:
+                    log.data.extend(reductions)
+                index += 1
+        return SegmentedResult(starts, ends, errors, log)
@@ -0,0 +1,236 @@
+import json
+import mmap
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = b"PGATBL01"
+# Every array in the buffer starts on a multiple of ALIGNMENT bytes.
+ALIGNMENT = 64
+
+
+def align(offset):
+    """
+    :param offset: int, byte offset.
+    :return: int, the smallest multiple of ALIGNMENT not less than offset.
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class CompiledTables:
+    """
+    Compiled analysis tables of one grammar, laid out in a single flat buffer.
+
+    The buffer starts with MAGIC, an 8-byte little-endian header length and a JSON header
+    holding the symbol map and the dtype, shape and offset of every array. The arrays follow
+    from the next multiple of ALIGNMENT bytes, each aligned to ALIGNMENT bytes.
+    Productions are stored as three int32 arrays: prod_lhs (symbol id of the non-terminal),
+    prod_offsets and prod_rhs (symbol ids of every formula, formula i is
+    prod_rhs[prod_offsets[i]:prod_offsets[i + 1]]).
+
+    An instance exposes the same attributes the analyzers read from a FormMatrix,
+    so it can be passed to OperatorPriorityAn or SimplePriority in place of one.
+    The arrays of an attached or loaded instance are read-only views of the buffer.
+    """
+
+    def __init__(self, kind, symbols, arrays, buffer=None):
+        """
+        :param kind: str, "operator" for OperatorPriority tables, "simple" for SimplePriority tables.
+        :param symbols: dict, symbol name lists of the tables, "ts" and "non_ts" for operator tables,
+            "symbols" for simple tables.
+        :param arrays: dict, array name -> numpy array.
+        :param buffer: object, the shared memory or mmap the arrays are viewing, kept alive with the instance.
+        """
+        self.kind = kind
+        self.symbol_lists = symbols
+        self.arrays = arrays
+        self.buffer = buffer
+        self.grammar = None
+
+        if kind == "operator":
+            self.ts = symbols["ts"]
+            self.non_ts = symbols["non_ts"]
+            self.floyd_index = ["f", "g"]
+            self.priority_matrix = arrays["priority_matrix"]
+            self.floyd_matrix = arrays["floyd_matrix"]
+            names = self.ts + self.non_ts
+        elif kind == "simple":
+            self.symbols = symbols["symbols"]
+            self.relation_matrix = arrays["relation_matrix"]
+            names = self.symbols
+        else:
+            raise ValueError("Unknown table kind {}.".format(kind))
+
+        lhs = arrays["prod_lhs"].tolist()
+        offsets = arrays["prod_offsets"].tolist()
+        rhs = arrays["prod_rhs"].tolist()
+        self.productions = [(names[lhs[i]], " ".join(names[s] for s in rhs[offsets[i]:offsets[i + 1]]))
+                            for i in range(len(lhs))]
+
+    @classmethod
+    def from_form_matrix(cls, form_matrix):
+        """
+        Collect the tables of a compiled grammar.
+
+        :param form_matrix: OperatorPriority.FormMatrix.FormMatrix or SimplePriority.FormMatrix.FormMatrix.
+        :return: CompiledTables, holding copies of the tables.
+        """
+        if hasattr(form_matrix, "floyd_matrix"):
+            kind = "operator"
+            symbols = {"ts": list(form_matrix.ts), "non_ts": list(form_matrix.non_ts)}
+            names = symbols["ts"] + symbols["non_ts"]
+            arrays = {"priority_matrix": np.asarray(form_matrix.priority_matrix, dtype=np.int8),
+                      "floyd_matrix": np.asarray(form_matrix.floyd_matrix, dtype=np.int32)}
+        else:
+            kind = "simple"
+            symbols = {"symbols": list(form_matrix.symbols)}
+            names = symbols["symbols"]
+            arrays = {"relation_matrix": np.asarray(form_matrix.relation_matrix, dtype=np.int8)}
+
+        symbol_ids = {symbol: i for i, symbol in enumerate(names)}
+        lhs = []
+        offsets = [0]
+        rhs = []
+        for non_t, formula in form_matrix.productions:
+            lhs.append(symbol_ids[non_t])
+            rhs += [symbol_ids[char] for char in formula.split(" ")]
+            offsets.append(len(rhs))
+        arrays["prod_lhs"] = np.array(lhs, dtype=np.int32)
+        arrays["prod_offsets"] = np.array(offsets, dtype=np.int32)
+        arrays["prod_rhs"] = np.array(rhs, dtype=np.int32)
+        return cls(kind, symbols, arrays)
+
+    def layout(self):
+        """
+        Compute the header and the total size of the flat buffer.
+        Array offsets in the header are relative to the aligned end of the header.
+
+        :return: tuple (bytes, int, int), encoded header, offset of the first array and total buffer size.
+        """
+        entries = dict()
+        offset = 0
+        for name, array in self.arrays.items():
+            offset = align(offset)
+            entries[name] = [array.dtype.str, list(array.shape), offset]
+            offset += array.nbytes
+        header = json.dumps({"kind": self.kind, "symbols": self.symbol_lists, "arrays": entries}).encode("utf-8")
+        data_start = align(len(MAGIC) + 8 + len(header))
+        return header, data_start, data_start + offset
+
+    def write_into(self, buffer):
+        """
+        Write the flat representation into a writable buffer.
+
+        :param buffer: writable buffer object, at least nbytes long.
+        """
+        header, data_start, size = self.layout()
+        view = memoryview(buffer)
+        view[:len(MAGIC)] = MAGIC
+        view[len(MAGIC):len(MAGIC) + 8] = len(header).to_bytes(8, "little")
+        view[len(MAGIC) + 8:len(MAGIC) + 8 + len(header)] = header
+        view.release()
+        entries = json.loads(header)["arrays"]
+        for name, array in self.arrays.items():
+            dtype, shape, offset = entries[name]
+            target = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=data_start + offset)
+            target[...] = array
+
+    @property
+    def nbytes(self):
+        return self.layout()[2]
+
+    def to_bytes(self):
+        """
+        :return: bytes, the flat representation.
+        """
+        buffer = bytearray(self.nbytes)
+        self.write_into(buffer)
+        return bytes(buffer)
+
+    def publish(self, name=None):
+        """
+        Copy the tables into a new shared memory block.
+        The caller owns the block, and should close and unlink it when all workers are done.
+
+        :param name: str, name of the shared memory block, a random name is used if None.
+        :return: multiprocessing.shared_memory.SharedMemory, the block holding the tables.
+        """
+        block = shared_memory.SharedMemory(name=name, create=True, size=self.nbytes)
+        self.write_into(block.buf)
+        return block
+
+    def save(self, file_name):
+        """
+        Write the tables to a file, which can be mapped by load.
+
+        :param file_name: str, file directory.
+        """
+        with open(file_name, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buffer, owner=None):
+        """
+        Create read-only array views over a flat buffer, without copying.
+
+        :param buffer: buffer object holding the flat representation.
+        :param owner: object, kept alive with the returned instance, default to buffer.
+        :return: CompiledTables.
+        :raise ValueError: When the buffer does not hold compiled tables.
+        """
+        view = memoryview(buffer)
+        if not bytes(view[:len(MAGIC)]) == MAGIC:
+            raise ValueError("Buffer does not contain compiled grammar tables.")
+        header_length = int.from_bytes(view[len(MAGIC):len(MAGIC) + 8], "little")
+        header = json.loads(bytes(view[len(MAGIC) + 8:len(MAGIC) + 8 + header_length]))
+        view.release()
+        data_start = align(len(MAGIC) + 8 + header_length)
+        arrays = dict()
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            array = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=data_start + offset)
+            array.flags.writeable = False
+            arrays[name] = array
+        return cls(header["kind"], header["symbols"], arrays, buffer=buffer if owner is None else owner)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach to tables published in shared memory by another process.
+
+        :param name: str, name of the shared memory block.
+        :return: CompiledTables, with arrays viewing the shared block.
+        """
+        try:
+            # Python 3.13+, keep the resource tracker of this process from unlinking the block on exit.
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before 3.13 attaching always registers the block. Processes started by multiprocessing
+            # share the tracker of the publisher, which owns the block, so the registration is left
+            # to it. Any other process starts a tracker of its own here, which would unlink the
+            # block when this process exits.
+            shared = getattr(resource_tracker._resource_tracker, "_fd", None) is not None
+            block = shared_memory.SharedMemory(name=name)
+            if not shared:
+                resource_tracker.unregister(block._name, "shared_memory")
+        return cls.from_buffer(block.buf, owner=block)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Map a file written by save into memory.
+
+        :param file_name: str, file directory.
+        :return: CompiledTables, with arrays viewing the mapped file.
+        """
+        with open(file_name, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(mapped)
+
+    def get_all_formulas(self, non_t):
+        """
+        Returns all formulas corresponding to the specified non-terminal symbol.
+
+        :param non_t: string, the non-terminal symbol.
+        :return: list, all formulas corresponding to the specified non-terminal symbol
+        """
+        return [formula for symbol, formula in self.productions if symbol == non_t]
@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
 
+from DerivedTables import DerivedTable, build_order
+from Grammar import as_grammar
+from Instrumentation import NULL_BUILD_STATS
+
 
 def cal_matrix_pow(matrix, n):
     """
@@ -18,23 +22,50 @@ def cal_matrix_pow(matrix, n):
 
 
 class FormMatrix:
-    def __init__(self, grammar):
-        self.grammar = grammar
-        self.non_ts = grammar[~grammar.index.duplicated(keep='first')].index
+    """
+    Simple priority tables of a grammar.
+
+    Symbols are gathered on construction. The LEAD, LAST and EQUAL matrices and the relation
+    matrix built from them are DerivedTable attributes, built on first access together with the
+    tables they depend on. Assign a table before reading it to skip building it and everything
+    only it depends on, e.g. relation_matrix loaded from a cache. Call build to build tables up front.
+    """
+
+    def __init__(self, grammar, stats=None):
+        """
+        :param grammar: Grammar or pandas data frame, containing grammar details.
+        :param stats: Instrumentation.BuildStats, optional, records time, iterations and size of every phase.
+        """
+        self.grammar = as_grammar(grammar)
+        self.non_ts = self.grammar.non_ts
+        self.productions = self.grammar.productions
+        self.stats = NULL_BUILD_STATS if stats is None else stats
         # self.print_grammar()
 
-        # Calculate LEAD, LAST and EQUAL matrix.
-        self.symbols = self.gather_all_symbols()
-        self.symbol_count = len(self.symbols)
-        lead_matrix = self.cal_matrix("lead")
-        last_matrix = self.cal_matrix("last")
-        self.equal_matrix = self.cal_equal()
+        with self.stats.phase("symbols") as phase:
+            self.symbols = self.gather_all_symbols()
+            self.symbol_count = len(self.symbols)
+            phase.shape = (self.symbol_count,)
 
+    @DerivedTable("lead")
+    def lead_matrix(self):
+        return self.cal_matrix("lead")
+
+    @DerivedTable("last")
+    def last_matrix(self):
+        return self.cal_matrix("last")
+
+    @DerivedTable("equal")
+    def equal_matrix(self):
+        return self.cal_equal()
+
+    @DerivedTable("relation", ("lead_matrix", "last_matrix", "equal_matrix"))
+    def relation_matrix(self):
         # Calculate < (lower) and > (prior) matrix.
-        lower_matrix = np.dot(self.equal_matrix, lead_matrix)
-        lead_matrix_s = lead_matrix.copy()
+        lower_matrix = np.dot(self.equal_matrix, self.lead_matrix)
+        lead_matrix_s = self.lead_matrix.copy()
         np.fill_diagonal(lead_matrix_s, 1)
-        prior_matrix = last_matrix.T.dot(self.equal_matrix).dot(lead_matrix_s)
+        prior_matrix = self.last_matrix.T.dot(self.equal_matrix).dot(lead_matrix_s)
         for non_t in self.non_ts:
             prior_matrix[:, self.symbols.index(non_t)] = 0
         # self.print_matrix(lower_matrix, "lower")
@@ -42,7 +73,18 @@ class FormMatrix:
 
         # In relation matrix, 0 means N/A, 1 means prior, -1 means lower, 2 means equal.
         # relation_df is a more intuitive version, but not suitable for grammar analyzer.
-        self.relation_matrix = 2 * self.equal_matrix - lower_matrix + prior_matrix
+        return 2 * self.equal_matrix - lower_matrix + prior_matrix
+
+    def build(self, *names):
+        """
+        Build derived tables now, in the order of their dependencies.
+
+        :param names: str, names of the tables to build, default to all.
+        :return: FormMatrix, self.
+        """
+        for name in build_order(type(self), names or None):
+            getattr(self, name)
+        return self
 
     def print_grammar(self):
         """
@@ -71,16 +113,9 @@ class FormMatrix:
         Returns all formulas corresponding to the specified non-terminal symbol.
 
         :param non_t: string, the non-terminal symbol.
-        :return: list or pandas Series, all formulas corresponding to the specified non-terminal symbol
+        :return: list, all formulas corresponding to the specified non-terminal symbol
         """
-        formulas = self.grammar.loc[non_t]
-        formulas = formulas["formula"]
-        if type(formulas).__name__ == "str":
-            # If there is only one formula corresponding to the non-terminal symbol,
-            # the returned 'formulas' could be string object.
-            # Considering we have to traverse 'formulas', we turn it to a list here.
-            formulas = [formulas]
-        return formulas
+        return self.grammar.get_all_formulas(non_t)
 
     def gather_all_symbols(self):
         """
@@ -110,6 +145,7 @@ class FormMatrix:
         for i in range(0, result.shape[0]):
             for j in range(0, result.shape[0]):
                 if result_plus[j, i] == 1:
+                    self.stats.count()
                     for k in range(0, result.shape[0]):
                         result_plus[j, k] = result_plus[j, k] + result_plus[i, k]
         result_plus = np.where(result_plus.copy() > 0, 1, result_plus)
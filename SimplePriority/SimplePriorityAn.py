@@ -1,17 +1,129 @@
 import os
+from time import perf_counter_ns
 
+from ParseCache import grammar_fingerprint
+from ParseTree import ReductionLog
 from SimplePriority.FormMatrix import FormMatrix
-from utils import init_grammar
+from utils import load_grammar
 
 
 class SimplePriority:
-    def __init__(self, grammar):
-        self.grammar = grammar
-        self.form_matrix = FormMatrix(grammar)
+    def __init__(self, grammar, form_matrix=None, stats=None):
+        """
+        :param grammar: pandas data frame, containing grammar details. Ignored if form_matrix is given.
+        :param form_matrix: FormMatrix or SharedTables.CompiledTables, already compiled tables to use
+            instead of compiling grammar.
+        :param stats: Instrumentation.ParseStats, optional, receives counters of every analysis.
+        """
+        self.scan_index = 0
+        self.stats = stats
+        # Instrumentation.Profiler over self.productions, set it to profile every analysis.
+        self.profiler = None
+        # ParseCache, set it to reuse results of series analyzed before.
+        self.cache = None
+        if form_matrix is None:
+            # Build the tables now, so an invalid grammar fails here and not in a later analysis.
+            form_matrix = FormMatrix(grammar).build("relation_matrix")
+        self.grammar = form_matrix.grammar
+        self.form_matrix = form_matrix
 
         self.symbols = self.form_matrix.symbols
+
+        # Map every formula to the production id of its first occurrence in grammar.
+        self.productions = self.form_matrix.productions
+        self.reduction_index = dict()
+        for production, (non_t, formula) in enumerate(self.productions):
+            self.reduction_index.setdefault(formula, production)
+
+        # (symbol below, reduced non-terminal, current symbol) -> production ids of the unit reductions
+        # following that reduction, filled by build_unit_chains.
+        self.unit_chains = dict()
+        self.unit_chain_start = None
+        self.grammar_id = None
         self.relation_matrix = self.form_matrix.relation_matrix
 
+    @property
+    def relation_matrix(self):
+        return self.relation_table
+
+    @relation_matrix.setter
+    def relation_matrix(self, table):
+        """
+        Use another relation table, e.g. a TableCompression.CompressedTable.
+        grammar_id, the key of self.cache, follows its entries. Unit chains are dropped
+        if the entries change, call build_unit_chains again then.
+        """
+        self.relation_table = table
+        grammar_id = grammar_fingerprint("simple", self.productions, {"relation_matrix": table})
+        if not grammar_id == self.grammar_id:
+            self.unit_chains = dict()
+            self.unit_chain_start = None
+        self.grammar_id = grammar_id
+
+    def build_unit_chains(self, start_symbol):
+        """
+        Precompute the unit reduction chains control would run right after a reduction,
+        so it can apply a whole chain at once instead of searching the leftmost phrase every step.
+
+        After reducing into non-terminal A with prev below it and current as the scanning symbol,
+        control reduces A alone again by the unit formula 'A' as long as A > current and prev < A.
+        The chain stops at start_symbol when prev is '#', where control checks for acceptance.
+
+        Every reduction of a chain is still logged, traced and counted on its own, so trees and
+        traces are unchanged. What a chain saves are the leftmost phrase searches, with their
+        relation lookups and formula look-ups, of its unit reductions, see ParseStats.handle_searches.
+
+        :param start_symbol: str, the start symbol of this grammar, chains are only used in analyses with it.
+        """
+        # Non-terminal -> unit production reducing it.
+        units = dict()
+        for non_t in set(non_t for non_t, formula in self.productions):
+            if non_t in self.reduction_index:
+                units[non_t] = self.reduction_index[non_t]
+        non_ts = set(non_t for non_t, formula in self.productions)
+        currents = [symbol for symbol in self.symbols if symbol not in non_ts] + ["#"]
+
+        self.unit_chains = dict()
+        for prev in list(self.symbols) + ["#"]:
+            for non_t in units:
+                for current in currents:
+                    chain = []
+                    symbol = non_t
+                    while symbol in units and not (prev == "#" and symbol == start_symbol):
+                        if not (self.get_priority(symbol, current) == 1 and self.get_priority(prev, symbol) == -1):
+                            break
+                        production = units[symbol]
+                        chain.append(production)
+                        symbol = self.productions[production][0]
+                        # A cycle of unit formulas, leave it to control.
+                        if len(chain) > len(units):
+                            chain = []
+                            break
+                    if len(chain) > 0:
+                        self.unit_chains[(prev, non_t, current)] = tuple(chain)
+        self.unit_chain_start = start_symbol
+
+    def apply_unit_chain(self, chain, stack, span_starts, end, logs, current=None):
+        """
+        Reduce the top of stack along a chain built by build_unit_chains.
+
+        :param chain: tuple, production ids of the unit reductions in order.
+        :param stack: list, analysis stack, its top is replaced by the last non-terminal of the chain.
+        :param span_starts: list, index of the first input token covered by each stack item.
+        :param end: int, index of the last input token covered by the reductions.
+        :param logs: tuple, ReductionLog objects receiving every reduction.
+        :param current: str, current scanning identifier, if given every step is printed to console.
+        :return: str, the non-terminal on top of stack.
+        """
+        for production in chain:
+            non_t = self.productions[production][0]
+            for log in logs:
+                log.append(production, span_starts[-1], end)
+            stack[-1] = non_t
+            if current is not None:
+                self.print_stack(stack, current)
+        return non_t
+
     def get_priority(self, first, second):
         """
         Get the priority relationship between first and second identifiers.
@@ -38,59 +150,215 @@ class SimplePriority:
         print("[{:20}]<- {:5}{}{}{}".format(
             " ".join(stack), current, stack[-1], {0: "=", 1: ">", -1: "<"}[self.get_priority(stack[-1], current)], current))
 
-    def control(self, start_symbol, input_series):
+    def control(self, start_symbol, input_series, log=None, trace=True, use_cache=True):
         """
         The control function of simple priority grammar analysis.
 
         :param start_symbol: str, the start symbol of this grammar.
         :param input_series: list, input identifier series.
+        :param log: ReductionLog, if given, every reduction's production id and token span is appended to it.
+        :param trace: bool, whether to print analysis process to console.
+        :param use_cache: bool, whether to look the series up in self.cache when trace is off.
+            A hit is counted by self.stats as a cache hit, and is not profiled.
         """
-        print("====Analysis process====")
+        if use_cache and self.cache is not None and not trace:
+            result = self.cache.get(self.grammar_id, start_symbol, input_series, log is not None)
+            if result is None:
+                return self.cache.analyze(self, start_symbol, input_series, log)
+            input_series += ["#"]
+            self.scan_index = result.scan_index
+            if self.stats is not None:
+                self.stats.add_cache_hit(result.accepted)
+            return result.replay(log)
+
+        if trace:
+            print("====Analysis process====")
         stack = ["#"]
-        global scan_index
+        # Index of the first input token covered by each stack item.
+        span_starts = [-1]
         scan_index = 0
         input_series += ["#"]
 
-        current = input_series[scan_index]
-        self.print_stack(stack, current)
-        scan_index += 1
-
-        while True:
-            while not self.get_priority(stack[-1], current) == 1:
-                stack.append(current)
+        stats = self.stats
+        profiler = self.profiler
+        unit_chains = self.unit_chains if start_symbol == self.unit_chain_start else None
+        if profiler is not None:
+            profile_log = ReductionLog()
+            reduction_ns = []
+            shifts = dict()
+            handle_ns = 0
+            relation_ns = 0
+            last_cut = perf_counter_ns()
+        reductions = 0
+        searches = 0
+        probes = 0
+        max_depth = 0
+        accepted = False
+        try:
+            current = input_series[scan_index]
+            if trace:
                 self.print_stack(stack, current)
+            scan_index += 1
+
+            while True:
+                if profiler is None:
+                    relation = self.get_priority(stack[-1], current)
+                else:
+                    clock = perf_counter_ns()
+                    relation = self.get_priority(stack[-1], current)
+                    relation_ns += perf_counter_ns() - clock
+                if not relation == 1:
+                    if profiler is not None:
+                        shifts[current] = shifts.get(current, 0) + 1
+                    stack.append(current)
+                    span_starts.append(scan_index - 1)
+                    if trace:
+                        self.print_stack(stack, current)
+
+                    current = input_series[scan_index]
+                    scan_index += 1
+                    continue
+
+                if profiler is not None:
+                    clock = perf_counter_ns()
+                start_index = len(stack) - 1
+                while not self.get_priority(stack[start_index - 1], stack[start_index]) == -1:
+                    start_index -= 1
+
+                if stats is not None:
+                    reductions += 1
+                    searches += 1
+                    probes += len(stack) - start_index
+                    if len(stack) > max_depth:
+                        max_depth = len(stack)
+                production = self.reduction_index[" ".join(stack[start_index:])]
+                non_t = self.productions[production][0]
+                if profiler is not None:
+                    now = perf_counter_ns()
+                    handle_ns += now - clock
+                    profile_log.append(production, span_starts[start_index], scan_index - 1)
+                    reduction_ns.append(now - last_cut)
+                    last_cut = now
+                if log is not None:
+                    log.append(production, span_starts[start_index], scan_index - 1)
+                del stack[start_index:]
+                del span_starts[start_index + 1:]
+                stack.append(non_t)
+                if trace:
+                    self.print_stack(stack, current)
 
-                current = input_series[scan_index]
-                scan_index += 1
+                if unit_chains is not None:
+                    chain = unit_chains.get((stack[-2], non_t, current))
+                    if chain is not None:
+                        logs = (log,) if log is not None else ()
+                        if profiler is not None:
+                            logs += (profile_log,)
+                            reduction_ns += [0] * len(chain)
+                        non_t = self.apply_unit_chain(chain, stack, span_starts, scan_index - 1, logs,
+                                                      current if trace else None)
+                        if stats is not None:
+                            reductions += len(chain)
+                        if profiler is not None:
+                            now = perf_counter_ns()
+                            reduction_ns[-1] = now - last_cut
+                            last_cut = now
 
-            start_index = len(stack) - 1
-            while not self.get_priority(stack[start_index - 1], stack[start_index]) == -1:
-                start_index -= 1
+                if non_t == start_symbol:
+                    if not (len(stack) == 2 and scan_index == len(input_series)):
+                        continue
+                    accepted = True
+                    return
+        finally:
+            self.scan_index = scan_index
+            if stats is not None:
+                stats.add(scan_index - 1, reductions, probes, max(max_depth, len(stack)), accepted, searches)
+            if profiler is not None:
+                profiler.add_parse(profile_log, reduction_ns, shifts, handle_ns, relation_ns)
 
-            non_t = list(self.grammar.index[self.grammar['formula'] == " ".join(stack[start_index:])])[0]
-            del stack[start_index:]
-            stack.append(non_t)
-            self.print_stack(stack, current)
+    def initial_state(self):
+        """
+        :return: tuple (list, list), stack and span starts before the first token, the state resume starts from.
+        """
+        return ["#"], [-1]
 
-            if non_t == start_symbol:
-                if not (len(stack) == 2 and scan_index == len(input_series)):
+    def resume(self, start_symbol, input_series, position, state, log, checkpoints, interval, sync=None,
+               sync_from=0):
+        """
+        Continue an analysis from a saved state, for IncrementalParse.
+
+        The same analysis as control without trace, statistics, profiling and cache. The state at
+        a position depends only on the tokens before it: the stack right after shifting them,
+        before the reductions the next token triggers.
+
+        :param start_symbol: str, the start symbol of this grammar.
+        :param input_series: list, the whole input identifier series, ending with '#'.
+        :param position: int, index of the first token not read in state.
+        :param state: tuple, see initial_state, changed in place.
+        :param log: ReductionLog, receives the reductions.
+        :param checkpoints: list, receives a (position, state copy, log length) tuple at every shift
+            interval or more tokens past the last one in it.
+        :param interval: int, least number of tokens between two checkpoints.
+        :param sync: callable, called with (position, stack, span starts) after every shift from sync_from on,
+            the analysis stops if it returns True.
+        :param sync_from: int, first position to call sync at.
+        :return: bool, True if stopped by sync, False if the input is accepted.
+        """
+        stack, span_starts = state
+        unit_chains = self.unit_chains if start_symbol == self.unit_chain_start else None
+        last = checkpoints[-1][0] if len(checkpoints) > 0 else position
+        scan_index = position
+        try:
+            current = input_series[scan_index]
+            scan_index += 1
+            while True:
+                if not self.get_priority(stack[-1], current) == 1:
+                    stack.append(current)
+                    span_starts.append(scan_index - 1)
+                    if sync is not None and scan_index >= sync_from and sync(scan_index, stack, span_starts):
+                        return True
+                    if scan_index - last >= interval:
+                        checkpoints.append((scan_index, (list(stack), list(span_starts)), len(log)))
+                        last = scan_index
+                    current = input_series[scan_index]
+                    scan_index += 1
                     continue
-                return
 
-    def scan_series(self, start_symbol, series):
+                start_index = len(stack) - 1
+                while not self.get_priority(stack[start_index - 1], stack[start_index]) == -1:
+                    start_index -= 1
+                production = self.reduction_index[" ".join(stack[start_index:])]
+                non_t = self.productions[production][0]
+                log.append(production, span_starts[start_index], scan_index - 1)
+                del stack[start_index:]
+                del span_starts[start_index + 1:]
+                stack.append(non_t)
+
+                if unit_chains is not None:
+                    chain = unit_chains.get((stack[-2], non_t, current))
+                    if chain is not None:
+                        non_t = self.apply_unit_chain(chain, stack, span_starts, scan_index - 1, (log,))
+
+                if non_t == start_symbol and len(stack) == 2 and scan_index == len(input_series):
+                    return False
+        finally:
+            self.scan_index = scan_index
+
+    def scan_series(self, start_symbol, series, log=None, trace=True):
         """
         Scan on input series.
 
         :param series: list, containing input identifier series.
         :param start_symbol: str, the start symbol of grammar.
+        :param log: ReductionLog, optional, receives the reduction sequence of the analysis.
+        :param trace: bool, whether to print analysis process to console, self.cache is only used without it.
         """
         try:
-            self.control(start_symbol, series)
+            self.control(start_symbol, series, log, trace)
             print("Input series '{}' valid!".format(" ".join(series[:-1])))
         except (KeyError, ValueError, IndexError) as e:
-            print("Error at position {}. {}".format(scan_index + 1, e))
+            print("Error at position {}. {}".format(self.scan_index + 1, e))
 
 
 if __name__ == "__main__":
-    simple_priority = SimplePriority(init_grammar(os.path.join("data", "grammar.txt"), "txt_file"))
+    simple_priority = SimplePriority(load_grammar(os.path.join("data", "grammar.txt")))
     simple_priority.scan_series("E", "i * ( i + i ) + ( i * i ) + i * i".split(" "))
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+def index_dtype(count):
+    """
+    :param count: int, number of distinct indexes to hold, plus -1.
+    :return: numpy dtype, the smallest signed integer type holding them.
+    """
+    return np.int16 if count < 2 ** 15 else np.int32
+
+
+class CompressedTable:
+    """
+    Relation table stored as row and column equivalence classes.
+
+    Symbols whose rows are identical share one row class, and symbols whose columns are
+    identical share one column class, so only the distinct rows and columns are kept in
+    classes, indexed through row_class and col_class. A packed table further keeps the most
+    common entry of every row class in default, and stores only the entries differing from it by
+    row displacement: entry (r, c) lives at index base[r] + c of value when check holds r there,
+    every other entry of the row is default[r].
+
+    An instance is indexed like the dense matrix it compresses, table[i, j], so it can stand in
+    for priority_matrix or relation_matrix wherever single entries are read.
+    """
+
+    def __init__(self, shape, row_class, col_class, classes=None, default=None, base=None, check=None,
+                 value=None):
+        """
+        :param shape: tuple, shape of the dense matrix.
+        :param row_class: numpy array, row class of every row symbol.
+        :param col_class: numpy array, column class of every column symbol.
+        :param classes: numpy array, distinct entries by (row class, column class), None if packed.
+        :param default: numpy array, most common entry of every row class, only if packed.
+        :param base: numpy array, displacement of every row class in value, only if packed.
+        :param check: numpy array, row class owning every slot of value, -1 for free slots, only if packed.
+        :param value: numpy array, packed entries differing from the default of their row, only if packed.
+        """
+        self.shape = tuple(shape)
+        self.row_class = row_class
+        self.col_class = col_class
+        self.classes = classes
+        self.default = default
+        self.base = base
+        self.check = check
+        self.value = value
+        self.packed = classes is None
+
+    @classmethod
+    def from_matrix(cls, matrix, pack=False):
+        """
+        Compress a dense relation matrix.
+
+        :param matrix: numpy array, 2-D relation matrix, 0 meaning no relation.
+        :param pack: bool, whether to pack the entries of the distinct rows which differ from the
+            row's most common one by row displacement.
+        :return: CompressedTable.
+        """
+        matrix = np.asarray(matrix, dtype=np.int8)
+        rows, row_class = np.unique(matrix, axis=0, return_inverse=True)
+        columns, col_class = np.unique(rows.T, axis=0, return_inverse=True)
+        classes = np.ascontiguousarray(columns.T)
+        row_class = row_class.reshape(-1).astype(index_dtype(len(rows)))
+        col_class = col_class.reshape(-1).astype(index_dtype(len(columns)))
+        if not pack:
+            return cls(matrix.shape, row_class, col_class, classes=classes)
+        default = row_defaults(classes)
+        base, check, value = pack_rows(classes, default)
+        return cls(matrix.shape, row_class, col_class, default=default, base=base, check=check, value=value)
+
+    @property
+    def nbytes(self):
+        arrays = [self.row_class, self.col_class]
+        arrays += [self.default, self.base, self.check, self.value] if self.packed else [self.classes]
+        return sum(array.nbytes for array in arrays)
+
+    def __getitem__(self, index):
+        row, column = index
+        if not self.packed:
+            return self.classes[self.row_class[row], self.col_class[column]]
+        row = self.row_class[row]
+        slot = self.base[row] + self.col_class[column]
+        if self.check[slot] == row:
+            return self.value[slot]
+        return self.default[row]
+
+    def to_dense(self):
+        """
+        :return: numpy array, the dense matrix.
+        """
+        if not self.packed:
+            return self.classes[self.row_class[:, None], self.col_class[None, :]]
+        classes = np.repeat(self.default[:, None], int(self.col_class.max()) + 1, axis=1)
+        for row, base in enumerate(self.base):
+            slots = np.nonzero(self.check == row)[0]
+            classes[row, slots - base] = self.value[slots]
+        return classes[self.row_class[:, None], self.col_class[None, :]]
+
+    def print_stats(self, dense_bytes=None):
+        """
+        Print the size of the table against its dense matrix.
+
+        :param dense_bytes: int, size of the dense matrix, default to one byte per entry.
+        """
+        if dense_bytes is None:
+            dense_bytes = self.shape[0] * self.shape[1]
+        print("====Compressed table====")
+        print("{:17}{}".format("shape", "x".join(str(n) for n in self.shape)))
+        print("{:17}{}".format("row classes", int(self.row_class.max()) + 1 if len(self.row_class) > 0 else 0))
+        print("{:17}{}".format("column classes", int(self.col_class.max()) + 1 if len(self.col_class) > 0 else 0))
+        print("{:17}{}".format("packed", self.packed))
+        print("{:17}{} / {} ({:.1f}x)".format("bytes", self.nbytes, dense_bytes, dense_bytes / max(self.nbytes, 1)))
+        print()
+
+
+def row_defaults(classes):
+    """
+    :param classes: numpy array, 2-D matrix.
+    :return: numpy array, the most common entry of every row, the smallest one on ties.
+    """
+    values = np.unique(classes)
+    counts = (classes[:, :, None] == values[None, None, :]).sum(axis=1)
+    return values[counts.argmax(axis=1)].astype(classes.dtype)
+
+
+def pack_rows(classes, default, chunk=256):
+    """
+    Pack the entries of classes differing from the default of their row by first-fit row
+    displacement, rows with most such entries first.
+
+    The offsets a row may take are those putting its first entry on a free slot. They are read
+    off the free slots at once and tried chunk by chunk, every chunk with one numpy indexing,
+    instead of stepping one offset at a time.
+
+    :param classes: numpy array, 2-D matrix to pack.
+    :param default: numpy array, default entry of every row.
+    :param chunk: int, number of offsets tried at once.
+    :return: tuple (numpy array, numpy array, numpy array), base, check and value arrays.
+    """
+    row_count, column_count = classes.shape
+    differs = classes != default[:, None]
+    base = np.zeros(row_count, index_dtype(row_count * column_count + column_count))
+    check = np.full(int(differs.sum()) + 2 * column_count, -1, index_dtype(row_count))
+    value = np.zeros(len(check), classes.dtype)
+    used = column_count
+    for row in np.argsort(-differs.sum(axis=1), kind="stable"):
+        columns = np.nonzero(differs[row])[0]
+        if len(columns) == 0:
+            continue
+        if len(check) < used + 2 * column_count:
+            check = np.concatenate((check, np.full(len(check), -1, check.dtype)))
+            value = np.concatenate((value, np.zeros(len(value), value.dtype)))
+        # A row placed at offset fits under used + 1 at the latest, the end is always free.
+        offsets = np.nonzero(check[columns[0]:used + 1 + columns[0]] < 0)[0]
+        for start in range(0, len(offsets), chunk):
+            candidates = offsets[start:start + chunk]
+            fits = (check[candidates[:, None] + columns[None, :]] < 0).all(axis=1)
+            if fits.any():
+                offset = int(candidates[fits.argmax()])
+                break
+        base[row] = offset
+        check[offset + columns] = row
+        value[offset + columns] = classes[row, columns]
+        used = max(used, offset + column_count)
+    return base, check[:used].copy(), value[:used].copy()
+
+
+def compress_form_matrix(form_matrix, pack=False):
+    """
+    Compress the relation table of a compiled grammar.
+
+    The result can replace priority_matrix of an OperatorPriority FormMatrix, or relation_matrix of
+    a SimplePriority analyzer, e.g. analyzer.relation_matrix = compress_form_matrix(analyzer.form_matrix).
+
+    :param form_matrix: OperatorPriority or SimplePriority FormMatrix, LevelMatrix or SharedTables.CompiledTables.
+    :param pack: bool, whether to pack the distinct rows by row displacement.
+    :return: CompressedTable.
+    """
+    if hasattr(form_matrix, "priority_matrix"):
+        return CompressedTable.from_matrix(form_matrix.priority_matrix, pack)
+    return CompressedTable.from_matrix(form_matrix.relation_matrix, pack)
@@ -4,7 +4,7 @@ from OperatorPriority import FormMatrix as OFM
 from OperatorPriority import OperatorPriorityAn as OPA
 from SimplePriority import FormMatrix as SFM
 from SimplePriority import SimplePriorityAn as SPA
-from utils import init_grammar
+from utils import load_grammar
 
 
 def main_menu():
@@ -28,6 +28,20 @@ def main_menu():
             grammar_menu(choice)
 
 
+def load_form_matrix(grammar_type, grammar):
+    """
+    Compile all analysis tables of grammar at once, so an invalid grammar is reported on loading.
+
+    :param grammar_type: int, 1 for simple priority grammar, 2 for operator priority grammar.
+    :param grammar: Grammar, containing grammar details.
+    :return: SimplePriority or OperatorPriority FormMatrix.
+    :raise ValueError: When grammar is not a valid grammar of that type.
+    """
+    if grammar_type == 1:
+        return SFM.FormMatrix(grammar).build()
+    return OFM.FormMatrix(grammar).build()
+
+
 def grammar_menu(grammar_type):
     """
     Display grammar reset and input series analysis menu.
@@ -36,11 +50,10 @@ def grammar_menu(grammar_type):
         1 for simple priority grammar, 2 for operator priority grammar.
     """
     if grammar_type == 1:
-        grammar = init_grammar(os.path.join("SimplePriority", "data", "grammar.txt"), "txt_file")
-        form_matrix = SFM.FormMatrix(grammar)
+        grammar = load_grammar(os.path.join("SimplePriority", "data", "grammar.txt"))
     else:
-        grammar = init_grammar(os.path.join("OperatorPriority", "data", "grammar.txt"), "txt_file")
-        form_matrix = OFM.FormMatrix(grammar)
+        grammar = load_grammar(os.path.join("OperatorPriority", "data", "grammar.txt"))
+    form_matrix = load_form_matrix(grammar_type, grammar)
 
     header = {1: "简单", 2: "算符"}[grammar_type]
     start_symbol = "E"
@@ -76,20 +89,23 @@ def grammar_menu(grammar_type):
             if line_count == 0:
                 continue
 
-            start_symbol = lines[0].split("->")[0]
-            grammar = init_grammar(lines, "text")
-            if grammar_type == 1:
-                form_matrix = SFM.FormMatrix(grammar)
-            else:
-                form_matrix = OFM.FormMatrix(grammar)
+            try:
+                new_grammar = load_grammar(lines, "text")
+                form_matrix = load_form_matrix(grammar_type, new_grammar)
+            except ValueError as e:
+                # Grammar.GrammarError for malformed lines, ValueError for a grammar of the wrong type.
+                print(e)
+                continue
+            grammar = new_grammar
+            start_symbol = grammar.non_ts[0]
         elif choice == 2:
             print("输入需要分析的输入串，格式类似'i + i * i'，注意用空格将符号隔开。")
             input_line = input()
             if len(input_line) > 0:
                 if grammar_type == 1:
-                    grammar_an = SPA.SimplePriority(grammar)
+                    grammar_an = SPA.SimplePriority(grammar, form_matrix)
                 else:
-                    grammar_an = OPA.OperatorPriorityAn(grammar)
+                    grammar_an = OPA.OperatorPriorityAn(grammar, form_matrix)
                 grammar_an.scan_series(start_symbol, input_line.split(" "))
         elif choice == 3:
             if grammar_type == 1:
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pytest
+
+from Instrumentation import BuildStats
+from OperatorPriority.FormMatrix import FormMatrix as OperatorFormMatrix
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from SimplePriority.FormMatrix import FormMatrix as SimpleFormMatrix
+from SimplePriority.SimplePriorityAn import SimplePriority
+from main import load_form_matrix
+from utils import load_grammar
+
+# E + E and E * E give + and * two relations with each other.
+INVALID_OPERATOR = ["E->E + E|E * E|i"]
+
+
+def test_invalid_operator_grammar_fails_on_loading():
+    grammar = load_grammar(INVALID_OPERATOR, "text")
+    with pytest.raises(ValueError):
+        OperatorPriorityAn(grammar)
+    with pytest.raises(ValueError):
+        load_form_matrix(2, grammar)
+    with pytest.raises(ValueError):
+        OperatorFormMatrix(grammar).build()
+
+
+def test_analyzers_build_tables_on_loading():
+    stats = BuildStats()
+    grammar = load_grammar(os.path.join("SimplePriority", "data", "grammar.txt"))
+    analyzer = SimplePriority(None, SimpleFormMatrix(grammar, stats))
+    assert [phase.name for phase in stats.phases] == ["symbols", "lead", "last", "equal", "relation"]
+    assert analyzer.get_priority("#", "i") == -1
+    assert np.array_equal(load_form_matrix(1, grammar).relation_matrix, analyzer.relation_matrix)
+    assert "relation_matrix" in vars(SimplePriority(grammar).form_matrix)
+
+    stats = BuildStats()
+    form_matrix = OperatorFormMatrix(load_grammar(os.path.join("OperatorPriority", "data", "grammar.txt")), stats)
+    form_matrix.floyd_matrix = OperatorPriorityAn(None, load_form_matrix(2, form_matrix.grammar)).floyd_matrix
+    OperatorPriorityAn(None, form_matrix)
+    # f/g provided up front, nothing else is built.
+    assert [phase.name for phase in stats.phases] == ["terminals"]
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from Lexer import LexError, Lexer
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from utils import load_grammar
+
+SOURCE = ["v1 * (42 + x) /* comment\n", "spanning lines */ - y / 2 // done\n"]
+
+
+def test_terminal_ids_are_the_analyzer_ids_of_the_terminal_series():
+    analyzer = OperatorPriorityAn(load_grammar(os.path.join("OperatorPriority", "data", "grammar.txt")))
+    lexer = Lexer()
+    terminals = list(lexer.terminal_series(SOURCE))
+    ids = list(lexer.terminal_ids(SOURCE, analyzer.symbol_ids))
+    assert terminals == ["i", "*", "(", "i", "+", "i", ")", "-", "i", "/", "i"]
+    assert ids == [analyzer.symbol_ids[terminal] for terminal in terminals]
+    assert all(symbol_id < analyzer.non_t_base for symbol_id in ids)
+
+
+def test_terminal_ids_reports_symbols_missing_from_grammar():
+    lexer = Lexer()
+    with pytest.raises(LexError) as error:
+        list(lexer.terminal_ids(["i + i", "i - i"], {"i": 0, "+": 1}))
+    assert (error.value.line_number, error.value.column) == (2, 3)
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+from OperatorPriority.FormMatrix import FormMatrix as OperatorFormMatrix
+from OperatorPriority.OperatorPriorityAn import OperatorPriorityAn
+from ParseCache import ParseCache
+from ParseTree import ReductionLog
+from SimplePriority.SimplePriorityAn import SimplePriority
+from TableCompression import compress_form_matrix
+from utils import load_grammar
+
+
+def analyze(analyzer, series, use_cache=True):
+    log = ReductionLog()
+    try:
+        analyzer.control("E", list(series), log, trace=False, use_cache=use_cache)
+    except (KeyError, ValueError, IndexError):
+        return False, log.data.tolist()
+    return True, log.data.tolist()
+
+
+def test_shared_cache_keeps_analyzers_with_different_tables_apart():
+    form_matrix = OperatorFormMatrix(load_grammar(os.path.join("OperatorPriority", "data", "grammar.txt")))
+    left = OperatorPriorityAn(None, form_matrix)
+    right = OperatorPriorityAn(None, form_matrix)
+    # Make '+' right associative: f(+) below g(+).
+    floyd = np.array(form_matrix.floyd_matrix)
+    plus = form_matrix.ts.index("+")
+    floyd[0, plus], floyd[1, plus] = floyd[1, plus] - 1, floyd[1, plus]
+    right.floyd_matrix = floyd
+    assert not left.grammar_id == right.grammar_id
+
+    series = "i + i + i".split(" ")
+    expected = [analyze(left, series, False), analyze(right, series, False)]
+    assert not expected[0] == expected[1]
+    cache = ParseCache()
+    left.cache = right.cache = cache
+    for repeat in range(2):
+        assert [analyze(left, series), analyze(right, series)] == expected
+
+
+def test_grammar_id_follows_relation_table_entries():
+    analyzer = SimplePriority(load_grammar(os.path.join("SimplePriority", "data", "grammar.txt")))
+    analyzer.build_unit_chains("E")
+    grammar_id = analyzer.grammar_id
+    analyzer.relation_matrix = compress_form_matrix(analyzer.form_matrix)
+    assert analyzer.grammar_id == grammar_id
+    assert len(analyzer.unit_chains) > 0
+
+    relation = np.array(analyzer.form_matrix.relation_matrix)
+    relation[relation == 1] = 2
+    analyzer.relation_matrix = relation
+    assert not analyzer.grammar_id == grammar_id
+    assert len(analyzer.unit_chains) == 0
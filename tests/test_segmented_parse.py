@@ -0,0 +1,24 @@
+from SegmentedParse import CLOSERS, DELIMITERS, END_CODING, OPENERS, split_segments
+
+SEMICOLON, IDENTIFIER = DELIMITERS[0], 1
+OPEN, CLOSE = OPENERS[0], CLOSERS[0]
+
+
+def segments(codings):
+    starts, ends = split_segments(codings)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def test_split_segments_ignores_delimiters_inside_brackets():
+    # i ; ( i ; i ) ; #
+    codings = [IDENTIFIER, SEMICOLON, OPEN, IDENTIFIER, SEMICOLON, IDENTIFIER, CLOSE, SEMICOLON, END_CODING]
+    assert segments(codings) == [(0, 1), (2, 7)]
+
+
+def test_split_segments_after_unmatched_closer():
+    # ) ( i ; i ) ; i ;  -- the ';' inside the parentheses after the stray ')' does not end a segment.
+    codings = [CLOSE, OPEN, IDENTIFIER, SEMICOLON, IDENTIFIER, CLOSE, SEMICOLON, IDENTIFIER, SEMICOLON]
+    assert segments(codings) == [(0, 6), (7, 8)]
+    # A stray closing delimiter ends its segment like a matched one.
+    codings = [IDENTIFIER, CLOSERS[1], OPEN, IDENTIFIER, SEMICOLON, IDENTIFIER, CLOSE, SEMICOLON]
+    assert segments(codings) == [(0, 2), (2, 7)]
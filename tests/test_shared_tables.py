@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from OperatorPriority.FormMatrix import FormMatrix
+from SharedTables import CompiledTables
+from utils import load_grammar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def attach_kind(name, queue):
+    queue.put(CompiledTables.attach(name).kind)
+
+
+def test_attach_from_child_then_parent_keeps_block():
+    tables = CompiledTables.from_form_matrix(
+        FormMatrix(load_grammar(os.path.join(ROOT, "OperatorPriority", "data", "grammar.txt"))))
+    block = tables.publish()
+    try:
+        for method in ("fork", "spawn"):
+            context = multiprocessing.get_context(method)
+            queue = context.Queue()
+            process = context.Process(target=attach_kind, args=(block.name, queue))
+            process.start()
+            assert queue.get(timeout=60) == "operator"
+            process.join()
+            assert process.exitcode == 0
+
+        # A process not started by multiprocessing has a resource tracker of its own.
+        code = "from SharedTables import CompiledTables; print(CompiledTables.attach({!r}).kind)".format(block.name)
+        run = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        assert run.stdout.strip() == "operator"
+        assert "leaked" not in run.stderr
+
+        attached = CompiledTables.attach(block.name)
+        assert np.array_equal(attached.floyd_matrix, tables.floyd_matrix)
+        assert attached.productions == tables.productions
+        del attached
+    finally:
+        block.close()
+        block.unlink()
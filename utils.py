@@ -1,5 +1,7 @@
 import pandas as pd
 
+from Grammar import Grammar
+
 
 def process_binary(bin_str):
     """
@@ -29,6 +31,28 @@ def get_current_description(coding_array, scan_index, coding_df, column="seconda
     return desc
 
 
+def load_coding_table(file_name="coding.csv"):
+    """
+    Load the table of lexical codings.
+
+    :param file_name: string, coding table directory, a space separated file with
+        'coding', 'description' and 'secondary' columns.
+    :return: pandas data frame, indexed by coding.
+    """
+    return pd.read_csv(file_name, sep=" ", index_col=0)
+
+
+def get_description_map(coding_df, column="secondary"):
+    """
+    Turn coding table into a dict, for mapping whole coding arrays without data frame lookups.
+
+    :param coding_df: pandas data frame, information about coding and its corresponding identifiers.
+    :param column: string, the column to map to, see get_current_description.
+    :return: dict, coding -> identifier, codings without a valid identifier are left out.
+    """
+    return {int(coding): desc for coding, desc in coding_df[column].items() if type(desc).__name__ == "str"}
+
+
 def load_coding(file_name):
     """
     Load lexical analysis's output into coding array.
@@ -62,23 +86,22 @@ def init_grammar(file, method="csv_file"):
     """
     if method == "csv_file":
         return pd.read_csv(file, delimiter='`', index_col=0)
-    index = []
-    grammar_matrix = []
+    return load_grammar(file, method).to_dataframe()
+
+
+def load_grammar(file, method="txt_file"):
+    """
+    Load grammar into its interned form without building a data frame.
+
+    :param file: file directory or string list, see init_grammar.
+    :param method: str, 'csv_file', 'txt_file' or 'text', see init_grammar.
+    :raise GrammarError: When a line of a plain text grammar is malformed.
+    :return: Grammar, containing grammar details.
+    """
     if method == "txt_file":
-        with open(file, "r") as txt_file:
-            for line in txt_file.read().splitlines():
-                if len(line) == 2:
-                    continue
-                non_t, formulas = line.split("->")
-                non_t = non_t.strip()
-                for formula in formulas.split('|'):
-                    formula = formula.strip()
-                    index.append(non_t)
-                    grammar_matrix.append(formula)
-    elif method == "text":
-        for line in file:
-            non_t, formulas = line.split("->")
-            for formula in formulas.split('|'):
-                index.append(non_t)
-                grammar_matrix.append(formula)
-    return pd.DataFrame(grammar_matrix, index=index, columns=["formula"])
+        return Grammar.from_file(file)
+    if method == "text":
+        return Grammar.from_lines(file)
+    if method == "csv_file":
+        return Grammar.from_dataframe(init_grammar(file, method))
+    raise ValueError("Unknown grammar initialization method {}.".format(method))